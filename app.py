@@ -1,17 +1,42 @@
-from flask import Flask, request, redirect, url_for, session, render_template, jsonify, flash
+from flask import Flask, request, redirect, url_for, session, render_template, jsonify, flash, Response, stream_with_context, g, send_file, send_from_directory, abort
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 import requests
 import base64
+import csv
+import hashlib
+import io
+import mimetypes
 import secrets
 import os
+from collections import defaultdict, deque
 from datetime import datetime, timedelta
+from email.utils import parsedate_to_datetime
 import json
 from functools import wraps
+from itertools import islice
+from types import SimpleNamespace
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import time
+import click
+
+import id_ranges
+from assets import build_assets, load_manifest, pick_encoding
+from bom import BomPlanner
+from industry_costs import CostEstimator, MarketData
+from job_snapshot import JobSnapshot, SOURCE_COLUMNS
+from sde_store import SDEStore, import_sde
+from sync_scheduler import SyncScheduler
+from profiling import RequestProfiler
+from rollups import DIMENSIONS, GRANULARITIES, MEASURES, period_start, rollup_deltas, rollup_rows
+from single_flight import SingleFlight
+from sharding import ShardedSession, corporation_shard, current_corporation, router as shard_router
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', secrets.token_hex(32))
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///eve_industry.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///eve_industry.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 # EVE SSO Configuration
@@ -19,7 +44,43 @@ app.config['EVE_CLIENT_ID'] = os.environ.get('EVE_CLIENT_ID', 'your_client_id_he
 app.config['EVE_CLIENT_SECRET'] = os.environ.get('EVE_CLIENT_SECRET', 'your_client_secret_here')
 app.config['EVE_CALLBACK_URL'] = os.environ.get('EVE_CALLBACK_URL', 'http://localhost:5000/sso/callback')
 
-db = SQLAlchemy(app)
+# Seconds to wait after a job ends before syncing, so the ESI cache has picked up the change
+app.config['SYNC_CACHE_LAG'] = int(os.environ.get('SYNC_CACHE_LAG', 300))
+
+# Run the job completion scheduler in the first process that serves a request; with several
+# workers, a lock file in the instance folder keeps it to one of them
+app.config['SYNC_SCHEDULER'] = os.environ.get('SYNC_SCHEDULER', '1').lower() in ('1', 'true', 'yes')
+
+# Seconds between re-checks of the active jobs in the database, which reschedules jobs that
+# should have finished but were still active at their last sync, and jobs synced by other workers
+app.config['SYNC_RECHECK_INTERVAL'] = int(os.environ.get('SYNC_RECHECK_INTERVAL', 600))
+
+# Seconds after a successful sync during which further sync requests reuse its result
+app.config['SYNC_MIN_INTERVAL'] = int(os.environ.get('SYNC_MIN_INTERVAL', 60))
+
+# Profile requests (all, or only the endpoints and path prefixes in PROFILE_ROUTES) and keep
+# dumps of those slower than PROFILE_SLOW_MS; run.py --profile sets these too
+app.config['PROFILE'] = os.environ.get('PROFILE', '').lower() in ('1', 'true', 'yes')
+app.config['PROFILE_ROUTES'] = [route for route in os.environ.get('PROFILE_ROUTES', '').split(',') if route]
+app.config['PROFILE_SLOW_MS'] = int(os.environ.get('PROFILE_SLOW_MS', 500))
+
+# Store each corporation's jobs in its own SQLite database under instance/shards/
+app.config['SHARD_BY_CORPORATION'] = os.environ.get('SHARD_BY_CORPORATION', '').lower() in ('1', 'true', 'yes')
+
+# Material efficiency assumed for every manufacturing blueprint when planning materials
+app.config['BOM_MATERIAL_EFFICIENCY'] = int(os.environ.get('BOM_MATERIAL_EFFICIENCY', 10))
+
+# Type and blueprint store built from the SDE with `flask import-sde`; defaults to instance/sde.bin
+app.config['SDE_STORE_PATH'] = os.environ.get('SDE_STORE_PATH') or os.path.join(app.instance_path, 'sde.bin')
+
+# Market prices and cost indices, kept across restarts until ESI's cache of them expires
+app.config['MARKET_DATA_PATH'] = os.environ.get('MARKET_DATA_PATH') or os.path.join(app.instance_path, 'market.npz')
+
+# Solar system and facility tax (as a fraction) assumed when estimating install costs; defaults to Jita
+app.config['INDUSTRY_SYSTEM_ID'] = int(os.environ.get('INDUSTRY_SYSTEM_ID', 30000142))
+app.config['INDUSTRY_FACILITY_TAX'] = float(os.environ.get('INDUSTRY_FACILITY_TAX', 0.0025))
+
+db = SQLAlchemy(app, session_options={'class_': ShardedSession})
 migrate = Migrate(app, db)
 
 # Database Models
@@ -54,7 +115,8 @@ class RequiredJob(db.Model):
 class IndustryJob(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     job_id = db.Column(db.Integer, unique=True, nullable=False)  # ESI job ID
-    installer_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    installer_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)  # User whose sync found the job
+    installer_character_id = db.Column(db.Integer, nullable=True)  # Character that installed the job, from ESI
     facility_id = db.Column(db.BigInteger, nullable=False)
     station_id = db.Column(db.BigInteger, nullable=False)
     activity_id = db.Column(db.Integer, nullable=False)
@@ -79,6 +141,42 @@ class IndustryJob(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+class JobChange(db.Model):
+    """Append-only log of industry job status transitions, written during sync"""
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.Integer, nullable=False)  # ESI job ID
+    corporation_id = db.Column(db.Integer, nullable=True, index=True)
+    old_status = db.Column(db.String(20), nullable=True)  # None when the job was first seen
+    new_status = db.Column(db.String(20), nullable=False)
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class JobRollup(db.Model):
+    """Delivered jobs counted per hour or day, installer, activity and product, updated during sync"""
+    __table_args__ = (db.UniqueConstraint(
+        'corporation_id', 'granularity', 'period_start', 'installer_id', 'activity_id', 'product_type_id'
+    ),)
+    id = db.Column(db.Integer, primary_key=True)
+    corporation_id = db.Column(db.Integer, nullable=False)
+    granularity = db.Column(db.String(10), nullable=False)  # hour, day
+    period_start = db.Column(db.DateTime, nullable=False)
+    installer_id = db.Column(db.Integer, nullable=False)  # Character ID of the installer from ESI, 0 if unknown
+    activity_id = db.Column(db.Integer, nullable=False)
+    product_type_id = db.Column(db.Integer, nullable=False)  # 0 if unknown
+    jobs = db.Column(db.Integer, nullable=False, default=0)
+    runs = db.Column(db.Integer, nullable=False, default=0)
+    successful_runs = db.Column(db.Integer, nullable=False, default=0)
+
+class CorporationDataVersion(db.Model):
+    """
+    Counter bumped whenever a corporation's job data changes, used for HTTP cache validators,
+    with separate counters for the in-process caches built from industry jobs and required jobs
+    """
+    corporation_id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    jobs_version = db.Column(db.Integer, nullable=False, default=0)
+    requirements_version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
 class JobAssignment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     required_job_id = db.Column(db.Integer, db.ForeignKey('required_job.id'), nullable=False)
@@ -87,6 +185,44 @@ class JobAssignment(db.Model):
     assigned_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     assigned_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+# Job data tables that are split per corporation when sharding is enabled
+shard_router.init_app(app, db.metadata, {'required_job', 'industry_job', 'job_change', 'job_assignment', 'job_rollup'})
+
+@app.before_request
+def select_corporation_shard():
+    """Route the request's job queries to the logged in user's corporation"""
+    if not shard_router.enabled or 'character_id' not in session:
+        return
+    # Read on every request rather than kept in the session, as the corporation changes when
+    # `refresh_affiliations` sees that the character moved, possibly in another process
+    corporation_id = db.session.query(User.corporation_id).filter_by(character_id=session['character_id']).scalar()
+    g.shard_token = current_corporation.set(corporation_id)
+
+@app.teardown_request
+def reset_corporation_shard(exception=None):
+    token = g.pop('shard_token', None)
+    if token is not None:
+        current_corporation.reset(token)
+
+@app.context_processor
+def template_helpers():
+    def get_current_user():
+        """The logged in user, used by the navigation in base.html"""
+        if 'character_id' not in session:
+            return None
+        return User.query.filter_by(character_id=session['character_id']).first()
+    return {'get_current_user': get_current_user, 'now': datetime.utcnow}
+
+def profile_requested():
+    """Admins can profile a single request by adding `?profile=1` to its URL"""
+    if request.args.get('profile') != '1' or 'character_id' not in session:
+        return False
+    user = User.query.filter_by(character_id=session['character_id']).first()
+    return bool(user and user.is_admin)
+
+profiler = RequestProfiler()
+profiler.init_app(app, requested=profile_requested)
+
 # Authentication decorator
 def login_required(f):
     @wraps(f)
@@ -108,6 +244,106 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def conditional(f=None, *, key=None):
+    """
+    Answer with 304 Not Modified when the corporation's job data hasn't changed since the
+    client's copy, without running the view. The ETag also covers the user, the URL and
+    the deployed templates and assets, as those change the response too, and the value
+    returned by `key` for views that depend on anything else, e.g. the current time.
+    
+    There is no Last-Modified: a timestamp can't express most of what the ETag covers, so
+    If-Modified-Since alone would answer 304 for responses that have changed.
+    """
+    if f is None:
+        return lambda f: conditional(f, key=key)
+    
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        user = User.query.filter_by(character_id=session['character_id']).first()
+        if not user or session.get('_flashes'):
+            return f(*args, **kwargs)
+        
+        # Kept while the view runs, so its own reads of the version come from the identity map
+        data_version = db.session.get(CorporationDataVersion, user.corporation_id) if user.corporation_id else None
+        etag = hashlib.sha256(repr((
+            deployment_version, request.full_path, user.id, user.is_admin, user.corporation_id,
+            user.corporation_name, data_version.version if data_version else 0,
+            datetime.utcnow().date(),  # Pages show days left
+            key() if key else None
+        )).encode()).hexdigest()[:32]
+        
+        if etag in request.if_none_match:
+            response = Response(status=304)
+        else:
+            response = app.make_response(f(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    return decorated_function
+
+def bump_data_version(corporation_id, scope=None):
+    """
+    Mark a corporation's job data as changed; committed with the caller's transaction. A `scope` of
+    'jobs' or 'requirements' also invalidates the caches built from industry jobs or required jobs.
+    
+    :returns int: The new version of `scope`, or of the data as a whole
+    """
+    if corporation_id is None:
+        return None
+    data_version = db.session.get(CorporationDataVersion, corporation_id)
+    if data_version is None:
+        data_version = CorporationDataVersion(
+            corporation_id=corporation_id, version=0, jobs_version=0, requirements_version=0, updated_at=datetime.min
+        )
+        db.session.add(data_version)
+    data_version.version += 1
+    data_version.updated_at = datetime.utcnow()
+    if scope is None:
+        return data_version.version
+    column = f'{scope}_version'
+    setattr(data_version, column, getattr(data_version, column) + 1)
+    return getattr(data_version, column)
+
+def corporation_data_version(corporation_id, scope=None):
+    """Current version of a corporation's data, or of `scope` as in `bump_data_version`; 0 before its first change"""
+    data_version = db.session.get(CorporationDataVersion, corporation_id) if corporation_id else None
+    return getattr(data_version, f'{scope}_version' if scope else 'version') if data_version else 0
+
+# Fingerprinted assets from `flask build-assets`; without a build the original files are served
+asset_manifest = load_manifest(app.static_folder)
+asset_files = set(asset_manifest.values())
+
+@app.url_defaults
+def fingerprint_static_urls(endpoint, values):
+    if endpoint == 'static' and values.get('filename') in asset_manifest:
+        values['filename'] = asset_manifest[values['filename']]
+
+def send_static_asset(filename):
+    """Serve fingerprinted assets precompressed and cached forever, other static files as usual"""
+    if filename not in asset_files:
+        return app.send_static_file(filename)
+    path, encoding = pick_encoding(os.path.join(app.static_folder, filename), request.accept_encodings)
+    response = send_file(path, mimetype=mimetypes.guess_type(filename)[0], etag=False, conditional=False)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+app.view_functions['static'] = send_static_asset
+
+def compute_deployment_version():
+    # Changes whenever templates, assets or the SDE store are updated, so cached pages aren't reused across deployments
+    paths = [app.config['SDE_STORE_PATH']]
+    for root, _, files in os.walk(os.path.join(app.root_path, 'templates')):
+        paths.extend(os.path.join(root, name) for name in files)
+    mtimes = sorted((path, os.path.getmtime(path)) for path in paths if os.path.exists(path))
+    return hashlib.sha256(repr((mtimes, asset_manifest)).encode()).hexdigest()
+
+deployment_version = compute_deployment_version()
+
 # ESI API Helper Functions
 def get_esi_headers(access_token=None):
     headers = {
@@ -161,7 +397,8 @@ def fetch_character_industry_jobs(user):
     url = f'https://esi.evetech.net/latest/characters/{user.character_id}/industry/jobs/'
     headers = get_esi_headers(token)
     
-    response = requests.get(url, headers=headers)
+    # Without include_completed, jobs disappear from the list once they are delivered
+    response = requests.get(url, headers=headers, params={'include_completed': 'true'})
     if response.status_code == 200:
         return response.json()
     return None
@@ -178,7 +415,8 @@ def fetch_corporation_industry_jobs(user):
     url = f'https://esi.evetech.net/latest/corporations/{user.corporation_id}/industry/jobs/'
     headers = get_esi_headers(token)
     
-    response = requests.get(url, headers=headers)
+    # Without include_completed, jobs disappear from the list once they are delivered
+    response = requests.get(url, headers=headers, params={'include_completed': 'true'})
     if response.status_code == 200:
         return response.json()
     return None
@@ -193,6 +431,315 @@ def get_type_info(type_id):
         return response.json()
     return None
 
+# ID kinds that /universe/names/ can resolve; any other ID makes the whole request fail
+NAME_RESOLVABLE_KINDS = {
+    'faction', 'npc_corporation', 'npc_character', 'region', 'constellation',
+    'solar_system', 'station', 'character', 'corporation', 'alliance', 'legacy_entity'
+}
+
+# Names never change for these IDs, so they are cached for the lifetime of the process
+name_cache = {}
+
+def resolve_names(ids):
+    """Resolve entity and location IDs to names, skipping IDs ESI cannot resolve"""
+    names = {}
+    pending = []
+    for entity_id in set(ids):
+        if entity_id in name_cache:
+            names[entity_id] = name_cache[entity_id]
+        elif id_ranges.classify(entity_id) in NAME_RESOLVABLE_KINDS:
+            pending.append(entity_id)
+        # Structures and other spawned items need an authenticated /universe/structures/
+        # lookup with a scope we don't request, so they are left unresolved
+
+    url = 'https://esi.evetech.net/latest/universe/names/'
+    for i in range(0, len(pending), 1000):
+        response = requests.post(url, headers=get_esi_headers(), json=pending[i:i + 1000])
+        if response.status_code == 200:
+            for entry in response.json():
+                name_cache[entry['id']] = entry['name']
+                names[entry['id']] = entry['name']
+
+    return names
+
+# Memory-mapped SDE store, opened on first use; None if it has not been imported
+sde_store = None
+sde_store_lock = threading.Lock()
+
+def get_sde_store():
+    """Get the local SDE store, or None if there is no store file"""
+    global sde_store
+    with sde_store_lock:
+        if sde_store is None and os.path.exists(app.config['SDE_STORE_PATH']):
+            sde_store = SDEStore(app.config['SDE_STORE_PATH'])
+        return sde_store
+
+# Prices and cost indices of all types and systems, refetched when ESI's cache expires
+market_data = None
+market_data_lock = threading.Lock()
+
+def fetch_market_data():
+    """Fetch /markets/prices/ and /industry/systems/, or None if either request fails"""
+    responses = [
+        requests.get(f'https://esi.evetech.net/latest/{path}', headers=get_esi_headers())
+        for path in ('markets/prices/', 'industry/systems/')
+    ]
+    if any(response.status_code != 200 for response in responses):
+        return None
+    
+    # Both datasets are refreshed hourly; keep them until the first one expires
+    expires = datetime.utcnow() + timedelta(hours=1)
+    for response in responses:
+        if response.headers.get('Expires'):
+            expires = min(expires, parsedate_to_datetime(response.headers['Expires']).replace(tzinfo=None))
+    return MarketData.from_esi(responses[0].json(), responses[1].json(), expires)
+
+def get_market_data():
+    """Get current market data, from memory, the instance folder or ESI; stale data if ESI fails"""
+    global market_data
+    with market_data_lock:
+        if market_data is None and os.path.exists(app.config['MARKET_DATA_PATH']):
+            market_data = MarketData.load(app.config['MARKET_DATA_PATH'])
+        if market_data is None or market_data.expired:
+            fetched = fetch_market_data()
+            if fetched is not None:
+                market_data = fetched
+                os.makedirs(os.path.dirname(app.config['MARKET_DATA_PATH']) or '.', exist_ok=True)
+                market_data.save(app.config['MARKET_DATA_PATH'])
+        return market_data
+
+# Blueprint materials per run for cost estimates, built on first use
+cost_estimator = None
+cost_estimator_lock = threading.Lock()
+
+def get_cost_estimator():
+    """Get the cost estimator, or None without an SDE store"""
+    global cost_estimator
+    store = get_sde_store()
+    with cost_estimator_lock:
+        if cost_estimator is None and store is not None:
+            cost_estimator = CostEstimator(store)
+        return cost_estimator
+
+def fetch_affiliations(character_ids):
+    """Current corporation and alliance of characters, with one request per 1000 characters"""
+    affiliations = {}
+    character_ids = list(set(character_ids))
+    
+    url = 'https://esi.evetech.net/latest/characters/affiliation/'
+    for i in range(0, len(character_ids), 1000):
+        response = requests.post(url, headers=get_esi_headers(), json=character_ids[i:i + 1000])
+        if response.status_code == 200:
+            for entry in response.json():
+                affiliations[entry['character_id']] = entry
+    
+    return affiliations
+
+def corporation_names(corporation_ids, resolve=True):
+    """Names of corporations from the name cache or other members' records, then from ESI if `resolve` is set"""
+    names = {corporation_id: name_cache[corporation_id] for corporation_id in corporation_ids if corporation_id in name_cache}
+    pending = [corporation_id for corporation_id in set(corporation_ids) if corporation_id not in names]
+    if pending:
+        for corporation_id, name in db.session.query(User.corporation_id, User.corporation_name).filter(
+            User.corporation_id.in_(pending), User.corporation_name != None
+        ).distinct():
+            name_cache[corporation_id] = names[corporation_id] = name
+        pending = [corporation_id for corporation_id in pending if corporation_id not in names]
+    if pending and resolve:
+        names.update(resolve_names(pending))
+    return names
+
+def refresh_affiliations(user_ids, update_corporations=True):
+    """Update the corporation of users in the background, e.g. after they logged in; only fill in missing corporation names if `update_corporations` is not set"""
+    with app.app_context():
+        users = User.query.filter(User.id.in_(user_ids)).all()
+        affiliations = fetch_affiliations([user.character_id for user in users]) if update_corporations else {}
+        for user in users:
+            if user.character_id in affiliations:
+                user.corporation_id = affiliations[user.character_id]['corporation_id']
+        names = corporation_names([user.corporation_id for user in users if user.corporation_id])
+        for user in users:
+            user.corporation_name = names.get(user.corporation_id, user.corporation_name)
+        db.session.commit()
+
+# Runs the refreshes that logins defer, so a burst of logins doesn't start a thread each
+affiliation_refreshes = ThreadPoolExecutor(max_workers=2, thread_name_prefix='affiliation-refresh')
+
+# Recent sso_callback timings as (total seconds, seconds spent on the token exchange, affiliation deferred)
+login_latencies = deque(maxlen=1000)
+
+type_name_cache = {}
+
+def resolve_type_names(type_ids):
+    """Resolve type IDs to names, from the SDE store if possible and otherwise in ESI batches; unknown type IDs are left out"""
+    names = {type_id: type_name_cache[type_id] for type_id in type_ids if type_id in type_name_cache}
+    pending = [type_id for type_id in set(type_ids) if type_id not in names]
+    
+    store = get_sde_store()
+    if store:
+        for type_id in pending:
+            name = store.type_name(type_id)
+            if name:
+                names[type_id] = name
+        # Types newer than the imported SDE are still looked up on ESI
+        pending = [type_id for type_id in pending if type_id not in names]
+    
+    url = 'https://esi.evetech.net/latest/universe/names/'
+    for i in range(0, len(pending), 1000):
+        batch = pending[i:i + 1000]
+        response = requests.post(url, headers=get_esi_headers(), json=batch)
+        if response.status_code == 200:
+            resolved = {entry['id']: entry['name'] for entry in response.json() if entry['category'] == 'inventory_type'}
+        else:
+            # A single unknown ID fails the whole batch, so fall back to one lookup per type
+            resolved = {}
+            for type_id in batch:
+                type_info = get_type_info(type_id)
+                if type_info:
+                    resolved[type_id] = type_info['name']
+        type_name_cache.update(resolved)
+        names.update(resolved)
+    
+    return names
+
+def resolve_type_ids(type_names):
+    """
+    Resolve type names to type IDs, ignoring case, from the SDE store if possible and otherwise in ESI batches;
+    keyed by the names as given, with unknown names left out
+    """
+    ids = {}
+    pending = list(set(type_names))
+    
+    store = get_sde_store()
+    if store:
+        for type_name in pending:
+            type_id = store.type_id(type_name)
+            if type_id is not None:
+                ids[type_name] = type_id
+        pending = [type_name for type_name in pending if type_name not in ids]
+    
+    # ESI answers with the canonical spelling of each name
+    spellings = defaultdict(list)
+    for type_name in pending:
+        spellings[type_name.lower()].append(type_name)
+    
+    url = 'https://esi.evetech.net/latest/universe/ids/'
+    for i in range(0, len(pending), 500):
+        response = requests.post(url, headers=get_esi_headers(), json=pending[i:i + 500])
+        if response.status_code == 200:
+            for entry in response.json().get('inventory_types', []):
+                type_name_cache[entry['id']] = entry['name']
+                for type_name in spellings.get(entry['name'].lower(), ()):
+                    ids[type_name] = entry['id']
+    
+    return ids
+
+# Per-corporation columnar job snapshots with the jobs version they were built at, built on
+# first use and patched after each sync in this process; other processes' changes rebuild them
+job_snapshots = {}
+job_snapshots_lock = threading.Lock()
+
+def get_job_snapshot(corporation_id):
+    """Get the job snapshot of a corporation, building it from the database if it is missing or outdated"""
+    # Read before the jobs, so a snapshot is never older than its version
+    version = corporation_data_version(corporation_id, 'jobs')
+    with job_snapshots_lock:
+        snapshot_version, snapshot = job_snapshots.get(corporation_id, (None, None))
+        if snapshot_version != version:
+            with corporation_shard(corporation_id):
+                rows = db.session.query(*[getattr(IndustryJob, column) for column in SOURCE_COLUMNS]).filter(
+                    IndustryJob.corporation_id == corporation_id
+                ).all()
+            snapshot = JobSnapshot(rows)
+            job_snapshots[corporation_id] = (version, snapshot)
+        return snapshot
+
+def update_job_snapshot(corporation_id, jobs, version):
+    """Patch a corporation's snapshot with jobs synced at jobs `version`, or drop it if it missed other changes"""
+    with job_snapshots_lock:
+        snapshot_version, snapshot = job_snapshots.get(corporation_id, (None, None))
+        if snapshot is None:
+            return
+        if snapshot_version == version - 1:
+            snapshot.upsert(jobs)
+            job_snapshots[corporation_id] = (version, snapshot)
+        else:
+            del job_snapshots[corporation_id]
+
+# Per-corporation material planners with the requirements version they were built at, built on first
+# use and updated when requirements change in this process; other processes' changes rebuild them
+bom_planners = {}
+bom_planners_lock = threading.Lock()
+
+def get_bom_planner(corporation_id):
+    """Get the material planner of a corporation, building it if it is missing or outdated; None without an SDE store"""
+    store = get_sde_store()
+    if store is None:
+        return None
+    # Read before the requirements, so a planner is never older than its version
+    version = corporation_data_version(corporation_id, 'requirements')
+    with bom_planners_lock:
+        planner_version, planner = bom_planners.get(corporation_id, (None, None))
+        if planner_version != version:
+            planner = BomPlanner(store, app.config['BOM_MATERIAL_EFFICIENCY'])
+            with corporation_shard(corporation_id):
+                rows = db.session.query(RequiredJob.id, RequiredJob.type_id, RequiredJob.quantity_required).filter(
+                    RequiredJob.corporation_id == corporation_id,
+                    RequiredJob.is_active == True,
+                    RequiredJob.activity_id == 1
+                ).all()
+            for requirement_id, type_id, quantity in rows:
+                planner.set_requirement(requirement_id, type_id, quantity)
+            bom_planners[corporation_id] = (version, planner)
+        return planner
+
+def update_bom_planner(corporation_id, required_jobs, version):
+    """
+    Apply required jobs changed at requirements `version` to a corporation's planner, if it has been built,
+    or drop it if it missed other changes
+    """
+    with bom_planners_lock:
+        planner_version, planner = bom_planners.get(corporation_id, (None, None))
+        if planner is None:
+            return
+        if planner_version != version - 1:
+            del bom_planners[corporation_id]
+            return
+        for job in required_jobs:
+            if job.is_active and int(job.activity_id) == 1:
+                planner.set_requirement(job.id, int(job.type_id), int(job.quantity_required))
+            else:
+                planner.remove_requirement(job.id)
+        bom_planners[corporation_id] = (version, planner)
+
+def reset_bom_planner(corporation_id):
+    """Drop a corporation's planner so it is rebuilt on next use, after bulk changes"""
+    with bom_planners_lock:
+        bom_planners.pop(corporation_id, None)
+
+def add_job_rollups(jobs):
+    """Count delivered jobs in the rollups; committed with the caller's transaction"""
+    deltas = rollup_deltas(jobs)
+    if not deltas:
+        return
+    
+    # Load the rows of the affected periods at once, then update them and insert the missing ones
+    existing = {}
+    for rollup in JobRollup.query.filter(
+        JobRollup.corporation_id.in_({key[0] for key in deltas}),
+        JobRollup.period_start.in_({key[2] for key in deltas})
+    ):
+        existing[(rollup.corporation_id, rollup.granularity, rollup.period_start,
+                  rollup.installer_id, rollup.activity_id, rollup.product_type_id)] = rollup
+    
+    for key, counts in deltas.items():
+        if key in existing:
+            for measure, count in zip(MEASURES, counts):
+                setattr(existing[key], measure, getattr(existing[key], measure) + count)
+    new_rollups = rollup_rows({key: counts for key, counts in deltas.items() if key not in existing})
+    if new_rollups:
+        db.session.execute(db.insert(JobRollup), new_rollups)
+
 # Routes
 @app.route('/')
 def index():
@@ -234,6 +781,7 @@ def sso_callback():
         return redirect(url_for('index'))
     
     # Exchange code for tokens
+    started = time.perf_counter()
     auth_string = f"{app.config['EVE_CLIENT_ID']}:{app.config['EVE_CLIENT_SECRET']}"
     auth_bytes = auth_string.encode('ascii')
     auth_b64 = base64.b64encode(auth_bytes).decode('ascii')
@@ -250,6 +798,7 @@ def sso_callback():
     }
     
     response = requests.post('https://login.eveonline.com/v2/oauth/token', headers=headers, data=data)
+    sso_time = time.perf_counter() - started
     
     if response.status_code != 200:
         flash('Failed to get access token.', 'error')
@@ -280,20 +829,14 @@ def sso_callback():
     user.refresh_token = token_data['refresh_token']
     user.token_expires = datetime.utcnow() + timedelta(seconds=token_data['expires_in'])
     
-    # Get character's corporation info
-    char_info_url = f'https://esi.evetech.net/latest/characters/{character_id}/'
-    char_response = requests.get(char_info_url, headers=get_esi_headers(user.access_token))
-    if char_response.status_code == 200:
-        char_data = char_response.json()
-        user.corporation_id = char_data.get('corporation_id')
-        
-        # Get corporation name
-        if user.corporation_id:
-            corp_url = f'https://esi.evetech.net/latest/corporations/{user.corporation_id}/'
-            corp_response = requests.get(corp_url, headers=get_esi_headers())
-            if corp_response.status_code == 200:
-                corp_data = corp_response.json()
-                user.corporation_name = corp_data.get('name')
+    # Returning users keep their stored corporation and have it refreshed after the redirect;
+    # new users need it right away, which costs one affiliation request
+    deferred = user.corporation_id is not None
+    if not deferred:
+        affiliation = fetch_affiliations([character_id]).get(character_id)
+        if affiliation:
+            user.corporation_id = affiliation['corporation_id']
+            user.corporation_name = corporation_names([user.corporation_id], resolve=False).get(user.corporation_id)
     
     db.session.commit()
     
@@ -301,7 +844,14 @@ def sso_callback():
     session['character_name'] = character_name
     flash(f'Welcome, {character_name}!', 'success')
     
-    return redirect(url_for('dashboard'))
+    if deferred or not user.corporation_name:
+        affiliation_refreshes.submit(refresh_affiliations, [user.id], deferred)
+    
+    total_time = time.perf_counter() - started
+    login_latencies.append((total_time, sso_time, deferred))
+    response = redirect(url_for('dashboard'))
+    response.headers['Server-Timing'] = f'sso;dur={sso_time * 1000:.1f}, total;dur={total_time * 1000:.1f}'
+    return response
 
 @app.route('/logout')
 def logout():
@@ -311,6 +861,7 @@ def logout():
 
 @app.route('/dashboard')
 @login_required
+@conditional
 def dashboard():
     user = User.query.filter_by(character_id=session['character_id']).first()
     
@@ -327,13 +878,18 @@ def dashboard():
         corporation_id=user.corporation_id
     ).order_by(IndustryJob.updated_at.desc()).limit(10).all()
     
+    # Job counts come from the snapshot rather than loading every job
+    job_counts = get_job_snapshot(user.corporation_id).count_by('status')
+    
     return render_template('dashboard.html', 
                          user=user, 
                          required_jobs=required_jobs,
-                         recent_jobs=recent_jobs)
+                         recent_jobs=recent_jobs,
+                         job_counts=job_counts)
 
 @app.route('/jobs/required')
 @login_required
+@conditional
 def required_jobs():
     user = User.query.filter_by(character_id=session['character_id']).first()
     
@@ -353,8 +909,8 @@ def required_jobs():
 def industry_jobs():
     user = User.query.filter_by(character_id=session['character_id']).first()
     
-    # Sync jobs from ESI
-    sync_industry_jobs(user)
+    # Sync jobs from ESI, sharing a sync that is running or has just finished
+    sync_flights.do((user.id, user.corporation_id), lambda: sync_industry_jobs(user))
     
     jobs = IndustryJob.query.filter_by(
         corporation_id=user.corporation_id
@@ -362,22 +918,122 @@ def industry_jobs():
     
     return render_template('industry_jobs.html', jobs=jobs, user=user)
 
+# Columns included in industry job exports, in output order
+INDUSTRY_JOB_EXPORT_COLUMNS = [
+    'job_id', 'installer_id', 'facility_id', 'station_id', 'activity_id', 'blueprint_id',
+    'blueprint_type_id', 'blueprint_location_id', 'output_location_id', 'runs', 'cost',
+    'licensed_runs', 'probability', 'product_type_id', 'status', 'duration', 'start_date',
+    'end_date', 'pause_date', 'completed_date', 'completed_character_id', 'successful_runs',
+    'corporation_id'
+]
+
+# Rows fetched from the database, and written to the output, at a time
+INDUSTRY_JOB_EXPORT_CHUNK_SIZE = 1000
+
+def industry_job_export_query(corporation_id, since=None, until=None, statuses=None):
+    """Query the export columns of a corporation's jobs, optionally filtered by start date and status"""
+    query = db.session.query(*[getattr(IndustryJob, column) for column in INDUSTRY_JOB_EXPORT_COLUMNS]).filter(
+        IndustryJob.corporation_id == corporation_id
+    )
+    if since:
+        query = query.filter(IndustryJob.start_date >= since)
+    if until:
+        query = query.filter(IndustryJob.start_date < until)
+    if statuses:
+        query = query.filter(IndustryJob.status.in_(statuses))
+    # Ordered by the primary key so the database can stream rows straight from the index
+    return query.order_by(IndustryJob.id)
+
+def export_industry_jobs(query, fmt):
+    """Yield the rows of an export query as CSV or NDJSON text, a chunk of rows at a time"""
+    def serialize(value):
+        return value.isoformat() if isinstance(value, datetime) else value
+    
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == 'csv':
+        writer.writerow(INDUSTRY_JOB_EXPORT_COLUMNS)
+    
+    for i, row in enumerate(query.yield_per(INDUSTRY_JOB_EXPORT_CHUNK_SIZE), start=1):
+        values = [serialize(value) for value in row]
+        if fmt == 'csv':
+            writer.writerow(values)
+        else:
+            buffer.write(json.dumps(dict(zip(INDUSTRY_JOB_EXPORT_COLUMNS, values))) + '\n')
+        
+        if i % INDUSTRY_JOB_EXPORT_CHUNK_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    
+    if buffer.tell():
+        yield buffer.getvalue()
+
+# Periods returned by /api/jobs/rollups when no `since` date is given
+ROLLUP_DEFAULT_PERIODS = 48
+
+def parse_export_date(value):
+    return datetime.strptime(value, '%Y-%m-%d') if value else None
+
+def rollup_window(granularity):
+    """
+    The `since` and `until` dates of a rollups request; by default, the last periods up to and
+    including the current one. Raises ValueError for malformed dates.
+    """
+    until = parse_export_date(request.args.get('until')) or (
+        period_start(datetime.utcnow(), granularity) + GRANULARITIES[granularity]
+    )
+    since = parse_export_date(request.args.get('since')) or period_start(
+        until - GRANULARITIES[granularity] * ROLLUP_DEFAULT_PERIODS, granularity
+    )
+    return since, until
+
+def rollup_window_key():
+    """The window of a rollups request for its ETag, as the default window moves with the current period"""
+    try:
+        return rollup_window(request.args.get('granularity', 'day'))
+    except (KeyError, ValueError):
+        return None  # Answered with an error, which is never cached
+
+@app.route('/jobs/industry/export')
+@login_required
+def export_industry_jobs_route():
+    """Stream the corporation's industry job history as CSV or NDJSON"""
+    user = User.query.filter_by(character_id=session['character_id']).first()
+    
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
+    try:
+        since = parse_export_date(request.args.get('since'))
+        until = parse_export_date(request.args.get('until'))
+    except ValueError:
+        return jsonify({'error': 'since and until must be formatted as YYYY-MM-DD'}), 400
+    statuses = [status for status in request.args.get('status', '').split(',') if status]
+    
+    query = industry_job_export_query(user.corporation_id, since, until, statuses)
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(
+        stream_with_context(export_industry_jobs(query, fmt)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=industry_jobs.{fmt}'}
+    )
+
 @app.route('/admin')
 @admin_required
 def admin_panel():
     user = User.query.filter_by(character_id=session['character_id']).first()
     
     # Get statistics
+    snapshot = get_job_snapshot(user.corporation_id)
     stats = {
         'total_users': User.query.filter_by(corporation_id=user.corporation_id).count(),
         'active_required_jobs': RequiredJob.query.filter_by(
             corporation_id=user.corporation_id, 
             is_active=True
         ).count(),
-        'active_industry_jobs': IndustryJob.query.filter_by(
-            corporation_id=user.corporation_id,
-            status='active'
-        ).count()
+        'active_industry_jobs': snapshot.count_by('status').get('active', 0),
+        'job_snapshot_bytes': snapshot.nbytes
     }
     
     return render_template('admin.html', user=user, stats=stats)
@@ -403,13 +1059,161 @@ def create_required_job():
             job.deadline = datetime.strptime(request.form['deadline'], '%Y-%m-%d')
         
         db.session.add(job)
+        version = bump_data_version(user.corporation_id, 'requirements')
         db.session.commit()
+        update_bom_planner(user.corporation_id, [job], version)
         
         flash('Required job created successfully!', 'success')
         return redirect(url_for('required_jobs'))
     
     return render_template('create_job.html')
 
+# Industry activities and priorities a required job can have
+REQUIRED_JOB_ACTIVITIES = {1, 3, 4, 5, 8}
+REQUIRED_JOB_PRIORITIES = {'low', 'medium', 'high', 'critical'}
+
+# Rows validated, resolved and committed per transaction during bulk imports
+REQUIRED_JOB_IMPORT_CHUNK_SIZE = 1000
+
+def read_required_job_rows(stream, fmt):
+    """Yield (row number, row) pairs from a CSV or NDJSON byte stream, one row at a time"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        for row_number, row in enumerate(csv.DictReader(text), start=1):
+            yield row_number, row
+        return
+    
+    for row_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield row_number, row if isinstance(row, dict) else 'Invalid JSON object'
+
+def validate_required_job_row(row):
+    """Convert an imported row to RequiredJob column values, raising ValueError if it is invalid"""
+    if not isinstance(row, dict):
+        raise ValueError(row)
+    
+    def value(name):
+        field = row.get(name)
+        field = field.strip() if isinstance(field, str) else field
+        return None if field in (None, '') else field
+    
+    job = {'type_id': None, 'type_name': value('type_name')}
+    try:
+        if value('type_id') is not None:
+            job['type_id'] = int(value('type_id'))
+        job['activity_id'] = int(value('activity_id') or 1)
+        job['quantity_required'] = int(value('quantity_required'))
+    except (TypeError, ValueError):
+        raise ValueError('type_id, activity_id and quantity_required must be integers')
+    
+    if job['type_id'] is None and job['type_name'] is None:
+        raise ValueError('Either type_id or type_name is required')
+    if job['activity_id'] not in REQUIRED_JOB_ACTIVITIES:
+        raise ValueError(f"Unknown activity_id {job['activity_id']}")
+    if job['quantity_required'] < 1:
+        raise ValueError('quantity_required must be at least 1')
+    
+    job['priority'] = str(value('priority') or 'medium').lower()
+    if job['priority'] not in REQUIRED_JOB_PRIORITIES:
+        raise ValueError(f"Unknown priority {job['priority']!r}")
+    
+    job['deadline'] = None
+    if value('deadline') is not None:
+        try:
+            job['deadline'] = datetime.strptime(str(value('deadline')), '%Y-%m-%d')
+        except ValueError:
+            raise ValueError('deadline must be formatted as YYYY-MM-DD')
+    
+    job['notes'] = value('notes')
+    return job
+
+def import_required_jobs(rows, user):
+    """
+    Import (row number, row) pairs as required jobs for the user's corporation.
+    
+    Rows are processed in chunks, each resolved against ESI in batches and committed in
+    its own transaction, so memory use does not grow with the input. Yields an error dict
+    for every rejected row, and a summary dict at the end.
+    """
+    imported = failed = 0
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, REQUIRED_JOB_IMPORT_CHUNK_SIZE))
+        if not chunk:
+            break
+        
+        jobs = []
+        for row_number, row in chunk:
+            try:
+                jobs.append((row_number, validate_required_job_row(row)))
+            except ValueError as e:
+                failed += 1
+                yield {'row': row_number, 'error': str(e)}
+        
+        type_names = resolve_type_names([job['type_id'] for _, job in jobs if job['type_id'] is not None and job['type_name'] is None])
+        type_ids = resolve_type_ids([job['type_name'] for _, job in jobs if job['type_id'] is None])
+        
+        mappings = []
+        for row_number, job in jobs:
+            if job['type_id'] is None:
+                job['type_id'] = type_ids.get(job['type_name'])
+            elif job['type_name'] is None:
+                job['type_name'] = type_names.get(job['type_id'])
+            if job['type_id'] is None or job['type_name'] is None:
+                failed += 1
+                yield {'row': row_number, 'error': 'Unknown type'}
+                continue
+            job.update(corporation_id=user.corporation_id, created_by=user.id, created_at=datetime.utcnow(), is_active=True)
+            mappings.append((row_number, job))
+        
+        try:
+            db.session.bulk_insert_mappings(RequiredJob, [job for _, job in mappings])
+            bump_data_version(user.corporation_id, 'requirements')
+            db.session.commit()
+            imported += len(mappings)
+        except Exception as e:
+            db.session.rollback()
+            failed += len(mappings)
+            for row_number, _ in mappings:
+                yield {'row': row_number, 'error': f'Database error: {e}'}
+    
+    if imported:
+        reset_bom_planner(user.corporation_id)
+    yield {'imported': imported, 'failed': failed}
+
+def required_job_import_format(filename, mimetype):
+    if request.args.get('format') in ('csv', 'ndjson'):
+        return request.args['format']
+    if (filename or '').lower().endswith('.csv') or mimetype == 'text/csv':
+        return 'csv'
+    return 'ndjson'
+
+@app.route('/admin/jobs/import', methods=['POST'])
+@admin_required
+def import_required_jobs_route():
+    """Bulk import required jobs from an uploaded CSV/NDJSON file or the raw request body"""
+    user = User.query.filter_by(character_id=session['character_id']).first()
+    
+    upload = request.files.get('file')
+    if upload:
+        stream = upload.stream
+        fmt = required_job_import_format(upload.filename, upload.mimetype)
+    else:
+        stream = request.stream
+        fmt = required_job_import_format(None, request.mimetype)
+    
+    # The report is streamed back as NDJSON, one line per rejected row and a summary line
+    def generate():
+        for result in import_required_jobs(read_required_job_rows(stream, fmt), user):
+            yield json.dumps(result) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 @app.route('/admin/users')
 @admin_required
 def manage_users():
@@ -418,44 +1222,322 @@ def manage_users():
     users = User.query.filter_by(corporation_id=user.corporation_id).all()
     return render_template('manage_users.html', users=users, current_user=user)
 
+@app.route('/api/types/<int:type_id>')
+@login_required
+def get_type_name(type_id):
+    """Name of a type, used to fill in the type name when creating jobs"""
+    name = resolve_type_names([type_id]).get(type_id)
+    if name is None:
+        return jsonify({'error': 'Unknown type'}), 404
+    return jsonify({'type_id': type_id, 'name': name})
+
+@app.route('/api/jobs/bom')
+@login_required
+@conditional(key=lambda: app.config['BOM_MATERIAL_EFFICIENCY'])
+def job_bom():
+    """Jobs to run and materials to buy for all active manufacturing requirements of the corporation"""
+    user = User.query.filter_by(character_id=session['character_id']).first()
+    planner = get_bom_planner(user.corporation_id)
+    if planner is None:
+        return jsonify({'error': 'No SDE store has been imported'}), 503
+    
+    with bom_planners_lock:
+        plan = planner.plan()
+    names = resolve_type_names(list(plan['jobs']) + list(plan['materials']))
+    
+    return jsonify({
+        'requirements': len(planner),
+        'material_efficiency': planner.material_efficiency,
+        'jobs': [
+            {'type_id': type_id, 'type_name': names.get(type_id), 'blueprint_type_id': blueprint_type_id,
+             'activity_id': activity_id, 'runs': runs}
+            for type_id, (blueprint_type_id, activity_id, runs) in plan['jobs'].items()
+        ],
+        'materials': [
+            {'type_id': type_id, 'type_name': names.get(type_id), 'quantity': quantity}
+            for type_id, quantity in sorted(plan['materials'].items())
+        ]
+    })
+
+@app.route('/api/jobs/costs')
+@login_required
+def job_costs():
+    """Estimated install costs and material and product values of active manufacturing requirements and running jobs"""
+    user = User.query.filter_by(character_id=session['character_id']).first()
+    estimator = get_cost_estimator()
+    if estimator is None:
+        return jsonify({'error': 'No SDE store has been imported'}), 503
+    market = get_market_data()
+    if market is None:
+        return jsonify({'error': 'Market data is not available from ESI'}), 503
+    
+    system_id = request.args.get('system_id', app.config['INDUSTRY_SYSTEM_ID'], type=int)
+    options = {
+        'system_id': system_id,
+        'material_efficiency': app.config['BOM_MATERIAL_EFFICIENCY'],
+        'facility_tax': app.config['INDUSTRY_FACILITY_TAX'],
+    }
+    
+    requirements = db.session.query(
+        RequiredJob.id, RequiredJob.type_id, RequiredJob.type_name, RequiredJob.quantity_required
+    ).filter(
+        RequiredJob.corporation_id == user.corporation_id,
+        RequiredJob.is_active == True,
+        RequiredJob.activity_id == 1
+    ).order_by(RequiredJob.id).all()
+    blueprint_type_ids, runs = estimator.runs_for(
+        [requirement.type_id for requirement in requirements],
+        [requirement.quantity_required for requirement in requirements]
+    )
+    required = estimator.estimate(market, blueprint_type_ids, runs, **options)
+    
+    # Jobs already installed have paid their install cost; their output is still worth estimating
+    snapshot = get_job_snapshot(user.corporation_id)
+    statuses = ['active', 'paused', 'ready']
+    running = snapshot.mask(status=statuses, activity_id=1) | snapshot.mask(status=statuses, activity_id=11)
+    in_progress = estimator.estimate(
+        market, snapshot.columns['blueprint_type_id'][running], snapshot.columns['runs'][running], **options
+    )
+    
+    return jsonify({
+        **options,
+        'market': {'expires': market.expires.isoformat(), 'types': len(market.type_ids),
+                   'systems': len(market.system_ids), 'bytes': market.nbytes},
+        'cost_index': market.cost_index(system_id, 1),
+        'requirements': [{
+            'id': requirement.id,
+            'type_id': requirement.type_id,
+            'type_name': requirement.type_name,
+            'quantity': requirement.quantity_required,
+            'blueprint_type_id': int(blueprint_type_ids[i]) or None,
+            'runs': int(runs[i]),
+            'install_cost': round(float(required['install_cost'][i]), 2),
+            'material_value': round(float(required['material_value'][i]), 2),
+            'product_value': round(float(required['product_value'][i]), 2)
+        } for i, requirement in enumerate(requirements)],
+        'totals': {name: round(float(values.sum()), 2) for name, values in required.items()},
+        'jobs': {
+            'count': int(running.sum()),
+            'material_value': round(float(in_progress['material_value'].sum()), 2),
+            'product_value': round(float(in_progress['product_value'].sum()), 2)
+        }
+    })
+
+@app.route('/api/jobs/stats')
+@login_required
+@conditional
+def job_stats():
+    """Job counts and runs for the corporation, with optional status/activity/installer filters"""
+    user = User.query.filter_by(character_id=session['character_id']).first()
+    snapshot = get_job_snapshot(user.corporation_id)
+    
+    filters = {
+        'status': request.args.get('status').split(',') if request.args.get('status') else None,
+        'activity_id': request.args.get('activity_id', type=int),
+        'installer_id': request.args.get('installer_id', type=int),
+    }
+    
+    return jsonify({
+        'by_status': snapshot.count_by('status', **filters),
+        'by_activity': snapshot.count_by('activity_id', **filters),
+        'runs_by_product': snapshot.sum_by('product_type_id', **filters),
+        'snapshot': {'jobs': len(snapshot), 'bytes': snapshot.nbytes}
+    })
+
+@app.route('/api/jobs/changes')
+@login_required
+@conditional
+def job_changes():
+    """Job status transitions after the `since` change ID, oldest first, for incremental consumers"""
+    user = User.query.filter_by(character_id=session['character_id']).first()
+    since = request.args.get('since', 0, type=int)
+    limit = min(request.args.get('limit', 1000, type=int), 1000)
+    
+    changes = JobChange.query.filter(
+        JobChange.corporation_id == user.corporation_id,
+        JobChange.id > since
+    ).order_by(JobChange.id).limit(limit).all()
+    
+    return jsonify({
+        'changes': [{
+            'id': change.id,
+            'job_id': change.job_id,
+            'old_status': change.old_status,
+            'new_status': change.new_status,
+            'changed_at': change.changed_at.isoformat()
+        } for change in changes],
+        'next': changes[-1].id if changes else since
+    })
+
+@app.route('/api/jobs/rollups')
+@login_required
+@conditional(key=rollup_window_key)
+def job_rollups():
+    """Delivered jobs and runs per hour or day for the corporation, from the rollup tables"""
+    user = User.query.filter_by(character_id=session['character_id']).first()
+    granularity = request.args.get('granularity', 'day')
+    group_by = [column for column in request.args.get('group_by', '').split(',') if column]
+    if granularity not in GRANULARITIES or any(column not in DIMENSIONS for column in group_by):
+        return jsonify({'error': f"granularity must be one of {', '.join(GRANULARITIES)} "
+                                 f"and group_by a list of {', '.join(DIMENSIONS)}"}), 400
+    try:
+        since, until = rollup_window(granularity)
+    except ValueError:
+        return jsonify({'error': 'Dates must be formatted as YYYY-MM-DD'}), 400
+    
+    columns = [JobRollup.period_start] + [getattr(JobRollup, column) for column in group_by]
+    query = db.session.query(*columns, *[db.func.sum(getattr(JobRollup, measure)) for measure in MEASURES]).filter(
+        JobRollup.corporation_id == user.corporation_id,
+        JobRollup.granularity == granularity,
+        JobRollup.period_start >= since,
+        JobRollup.period_start < until
+    )
+    for column in DIMENSIONS:
+        if request.args.get(column, type=int) is not None:
+            query = query.filter(getattr(JobRollup, column) == request.args.get(column, type=int))
+    rows = query.group_by(*columns).order_by(*columns).all()
+    
+    series = [{
+        'period': row[0].isoformat(),
+        **dict(zip(group_by, row[1:1 + len(group_by)])),
+        **dict(zip(MEASURES, (int(value) for value in row[1 + len(group_by):])))
+    } for row in rows]
+    response = {'granularity': granularity, 'since': since.isoformat(), 'until': until.isoformat(),
+                'group_by': group_by, 'series': series}
+    if 'installer_id' in group_by:
+        # Installers are characters; those who don't use the app are looked up on ESI
+        installer_ids = {point['installer_id'] for point in series} - {0}
+        installers = {
+            member.character_id: member.character_name
+            for member in User.query.filter(User.character_id.in_(installer_ids))
+        } if installer_ids else {}
+        if installer_ids - set(installers):
+            installers.update(resolve_names(list(installer_ids - set(installers))))
+        response['installers'] = installers
+    return jsonify(response)
+
+@app.route('/api/login-stats')
+@admin_required
+def login_stats():
+    """Latency percentiles of recent logins in this process, in milliseconds"""
+    totals = sorted(total for total, _, _ in login_latencies)
+    
+    def percentile(values, p):
+        return round(values[min(len(values) - 1, int(len(values) * p))] * 1000, 1) if values else None
+    
+    return jsonify({
+        'logins': len(totals),
+        'deferred': sum(1 for _, _, deferred in login_latencies if deferred),
+        'p50_ms': percentile(totals, 0.5),
+        'p95_ms': percentile(totals, 0.95),
+        'sso_p50_ms': percentile(sorted(sso for _, sso, _ in login_latencies), 0.5),
+    })
+
+@app.route('/api/profiles')
+@admin_required
+def profiles():
+    """Recent slow or explicitly profiled requests in this process, newest first"""
+    return jsonify(list(reversed(profiler.slow_requests)))
+
+@app.route('/api/profiles/<name>')
+@admin_required
+def profile_dump(name):
+    """Folded stacks of a profiled request, for flamegraph.pl or speedscope"""
+    if not name.endswith('.folded'):
+        abort(404)
+    return send_from_directory(app.config['PROFILE_DIRECTORY'], name, mimetype='text/plain')
+
+# Overlapping syncs for the same user and corporation (open tabs, button clicks, the
+# scheduler) share one run; this is per process
+sync_flights = SingleFlight(app.config['SYNC_MIN_INTERVAL'])
+
 @app.route('/api/sync-jobs', methods=['POST'])
 @login_required
 def sync_jobs():
     user = User.query.filter_by(character_id=session['character_id']).first()
-    success = sync_industry_jobs(user)
+    success, outcome = sync_flights.do((user.id, user.corporation_id), lambda: sync_industry_jobs(user))
     
-    return jsonify({'success': success})
+    # `coalesced` is set when another request's sync was reused instead of starting a new one
+    return jsonify({'success': success, 'coalesced': outcome != 'ran'})
+
+@app.route('/api/sync-stats')
+@admin_required
+def sync_stats():
+    """How many sync requests ran, and how many were coalesced with a running or recent sync"""
+    return jsonify(sync_flights.stats())
+
+def parse_esi_datetime(value):
+    """Parse an ESI timestamp into a naive UTC datetime, as stored in the database"""
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+
+# Job columns that change during a job's lifetime, compared on every sync
+INDUSTRY_JOB_MUTABLE_FIELDS = {
+    'status': lambda job_data: job_data['status'],
+    'pause_date': lambda job_data: parse_esi_datetime(job_data.get('pause_date')),
+    'completed_date': lambda job_data: parse_esi_datetime(job_data.get('completed_date')),
+    'completed_character_id': lambda job_data: job_data.get('completed_character_id'),
+    'successful_runs': lambda job_data: job_data.get('successful_runs'),
+    # Never changes, but jobs synced before the column existed get it filled in
+    'installer_character_id': lambda job_data: job_data.get('installer_id'),
+}
 
 def sync_industry_jobs(user):
-    """Sync industry jobs from ESI to database"""
+    """Sync industry jobs from ESI to database, writing only jobs that changed"""
     try:
         # Fetch jobs from ESI
         char_jobs = fetch_character_industry_jobs(user)
         corp_jobs = fetch_corporation_industry_jobs(user) if user.corporation_id else []
         
-        all_jobs = []
-        if char_jobs:
-            all_jobs.extend(char_jobs)
-        if corp_jobs:
-            all_jobs.extend(corp_jobs)
+        # Jobs can show up in both the character and corporation lists
+        all_jobs = {}
+        for job_data in (char_jobs or []) + (corp_jobs or []):
+            all_jobs[job_data['job_id']] = job_data
+        
+        # Load all known jobs in one query per chunk instead of one query per job
+        job_ids = list(all_jobs)
+        existing_jobs = {}
+        for i in range(0, len(job_ids), 500):
+            for job in IndustryJob.query.filter(IndustryJob.job_id.in_(job_ids[i:i + 500])):
+                existing_jobs[job.job_id] = job
         
-        for job_data in all_jobs:
-            # Check if job already exists
-            existing_job = IndustryJob.query.filter_by(job_id=job_data['job_id']).first()
+        synced_jobs = []
+        changed_jobs = []
+        delivered_jobs = []
+        new_jobs = []
+        job_changes = []
+        now = datetime.utcnow()
+        for job_id, job_data in all_jobs.items():
+            existing_job = existing_jobs.get(job_id)
             
             if existing_job:
-                # Update existing job
-                existing_job.status = job_data['status']
-                existing_job.updated_at = datetime.utcnow()
-                if job_data.get('completed_date'):
-                    existing_job.completed_date = datetime.fromisoformat(job_data['completed_date'].replace('Z', '+00:00'))
-                if job_data.get('pause_date'):
-                    existing_job.pause_date = datetime.fromisoformat(job_data['pause_date'].replace('Z', '+00:00'))
+                # Update existing job, leaving it untouched if ESI reports the same state
+                changes = {
+                    field: value(job_data) for field, value in INDUSTRY_JOB_MUTABLE_FIELDS.items()
+                    if value(job_data) is not None and value(job_data) != getattr(existing_job, field)
+                }
+                if changes:
+                    if 'status' in changes:
+                        job_changes.append(dict(
+                            job_id=job_id,
+                            corporation_id=existing_job.corporation_id,
+                            old_status=existing_job.status,
+                            new_status=changes['status'],
+                            changed_at=now
+                        ))
+                    for field, value in changes.items():
+                        setattr(existing_job, field, value)
+                    existing_job.updated_at = now
+                    changed_jobs.append(existing_job)
+                    if changes.get('status') == 'delivered':
+                        delivered_jobs.append(existing_job)
             else:
                 # Create new job
-                new_job = IndustryJob(
+                new_job = dict(
                     job_id=job_data['job_id'],
                     installer_id=user.id,
+                    installer_character_id=job_data.get('installer_id'),
                     facility_id=job_data['facility_id'],
                     station_id=job_data['station_id'],
                     activity_id=job_data['activity_id'],
@@ -470,25 +1552,270 @@ def sync_industry_jobs(user):
                     product_type_id=job_data.get('product_type_id'),
                     status=job_data['status'],
                     duration=job_data['duration'],
-                    start_date=datetime.fromisoformat(job_data['start_date'].replace('Z', '+00:00')),
-                    end_date=datetime.fromisoformat(job_data['end_date'].replace('Z', '+00:00')),
-                    corporation_id=user.corporation_id
+                    start_date=parse_esi_datetime(job_data['start_date']),
+                    end_date=parse_esi_datetime(job_data['end_date']),
+                    pause_date=parse_esi_datetime(job_data.get('pause_date')),
+                    completed_date=parse_esi_datetime(job_data.get('completed_date')),
+                    completed_character_id=job_data.get('completed_character_id'),
+                    successful_runs=job_data.get('successful_runs'),
+                    corporation_id=user.corporation_id,
+                    created_at=now,
+                    updated_at=now
                 )
-                
-                if job_data.get('completed_date'):
-                    new_job.completed_date = datetime.fromisoformat(job_data['completed_date'].replace('Z', '+00:00'))
-                if job_data.get('pause_date'):
-                    new_job.pause_date = datetime.fromisoformat(job_data['pause_date'].replace('Z', '+00:00'))
-                
-                db.session.add(new_job)
+                new_jobs.append(new_job)
+                job_changes.append(dict(
+                    job_id=job_id,
+                    corporation_id=user.corporation_id,
+                    old_status=None,
+                    new_status=job_data['status'],
+                    changed_at=now
+                ))
+                existing_job = SimpleNamespace(**new_job)
+                changed_jobs.append(existing_job)
+                if existing_job.status == 'delivered':
+                    delivered_jobs.append(existing_job)
+            
+            synced_jobs.append(existing_job)
+        
+        # New jobs and change log entries are inserted with one statement each, not one per row
+        if new_jobs:
+            db.session.execute(db.insert(IndustryJob), new_jobs)
+        if job_changes:
+            db.session.execute(db.insert(JobChange), job_changes)
+        add_job_rollups(delivered_jobs)
         
+        # Read the jobs before the commit expires them, so they aren't reloaded one by one
+        schedule_job_completions(synced_jobs)
+        snapshot_rows = [SimpleNamespace(**{column: getattr(job, column) for column in SOURCE_COLUMNS}) for job in changed_jobs]
+        corporation_id = user.corporation_id
+        version = bump_data_version(corporation_id, 'jobs') if changed_jobs else None
         db.session.commit()
+        if version is not None:
+            update_job_snapshot(corporation_id, snapshot_rows, version)
         return True
-    except Exception as e:
-        print(f"Error syncing jobs: {e}")
+    except Exception:
+        # Leave the session usable for the rest of the request
+        db.session.rollback()
+        app.logger.exception('Error syncing jobs')
         return False
 
+@app.cli.command('import-required-jobs')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--character-id', type=int, required=True, help='Character the jobs are created by.')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), help='Input format, guessed from the file name by default.')
+def import_required_jobs_command(path, character_id, fmt):
+    """Bulk import required jobs from a CSV or NDJSON file"""
+    user = User.query.filter_by(character_id=character_id).first()
+    if not user or not user.corporation_id:
+        raise click.ClickException(f'No user with a corporation found for character {character_id}')
+    
+    fmt = fmt or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+    with open(path, 'rb') as stream, corporation_shard(user.corporation_id):
+        for result in import_required_jobs(read_required_job_rows(stream, fmt), user):
+            if 'error' in result:
+                click.echo(f"Row {result['row']}: {result['error']}", err=True)
+            else:
+                click.echo(f"Imported {result['imported']} required jobs, {result['failed']} rows failed")
+
+@app.cli.command('rollup-backfill')
+@click.option('--corporation-id', type=int, help='Only rebuild the rollups of this corporation.')
+def rollup_backfill_command(corporation_id):
+    """Rebuild the job rollups from the delivered jobs in the database"""
+    if corporation_id:
+        corporation_ids = [corporation_id]
+    else:
+        corporation_ids = sorted(
+            row[0] for row in db.session.query(User.corporation_id).filter(User.corporation_id.isnot(None)).distinct()
+        )
+    
+    columns = ('corporation_id', 'installer_character_id', 'activity_id', 'product_type_id',
+               'runs', 'successful_runs', 'completed_date', 'end_date')
+    for corporation_id in corporation_ids:
+        with corporation_shard(corporation_id):
+            # Count jobs in chunks, so the history is never loaded at once
+            query = db.select(*[getattr(IndustryJob, column) for column in columns]).where(
+                IndustryJob.corporation_id == corporation_id,
+                IndustryJob.status == 'delivered'
+            ).execution_options(yield_per=INDUSTRY_JOB_EXPORT_CHUNK_SIZE)
+            deltas = rollup_deltas(job for chunk in db.session.execute(query).partitions() for job in chunk)
+            
+            db.session.execute(db.delete(JobRollup).where(JobRollup.corporation_id == corporation_id))
+            if deltas:
+                db.session.execute(db.insert(JobRollup), rollup_rows(deltas))
+            bump_data_version(corporation_id)
+            db.session.commit()
+        jobs = sum(counts[0] for key, counts in deltas.items() if key[1] == 'day')
+        click.echo(f'Corporation {corporation_id}: {jobs} delivered jobs in {len(deltas)} rollup rows')
+
+@app.cli.command('import-sde')
+@click.argument('path', type=click.Path(exists=True))
+def import_sde_command(path):
+    """Build the local type and blueprint store from the SDE zip file or an extracted copy"""
+    os.makedirs(os.path.dirname(app.config['SDE_STORE_PATH']) or '.', exist_ok=True)
+    types, blueprints = import_sde(path, app.config['SDE_STORE_PATH'])
+    click.echo(f"Stored {types} types and {blueprints} blueprints in {app.config['SDE_STORE_PATH']}")
+    click.echo('Restart the app to use the new store')
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Fingerprint and precompress the CSS and JavaScript files under static/"""
+    manifest = build_assets(app.static_folder)
+    for source, target in sorted(manifest.items()):
+        click.echo(f'{source} -> {target}')
+    click.echo('Restart the app to serve the new assets')
+
+@app.cli.command('export-industry-jobs')
+@click.option('--corporation-id', type=int, required=True, help='Corporation to export the jobs of.')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), default='csv', show_default=True)
+@click.option('--since', type=click.DateTime(['%Y-%m-%d']), help='Only jobs started on or after this date.')
+@click.option('--until', type=click.DateTime(['%Y-%m-%d']), help='Only jobs started before this date.')
+@click.option('--status', 'statuses', multiple=True, help='Only jobs with this status; can be repeated.')
+@click.option('--output', '-o', type=click.File('w'), default='-', help='File to write to, stdout by default.')
+def export_industry_jobs_command(corporation_id, fmt, since, until, statuses, output):
+    """Export industry job history as CSV or NDJSON"""
+    with corporation_shard(corporation_id):
+        query = industry_job_export_query(corporation_id, since, until, statuses)
+        for chunk in export_industry_jobs(query, fmt):
+            output.write(chunk)
+
+@app.cli.command('shard-stats')
+def shard_stats_command():
+    """Show job counts for every corporation, querying all shards in parallel"""
+    def counts():
+        return (
+            RequiredJob.query.filter_by(is_active=True).count(),
+            dict(db.session.query(IndustryJob.status, db.func.count()).group_by(IndustryJob.status).all())
+        )
+    
+    for corporation_id, (required, industry) in shard_router.fan_out(app, counts).items():
+        label = 'all corporations' if corporation_id is None else f'corporation {corporation_id}'
+        statuses = ', '.join(f'{status}: {count}' for status, count in sorted(industry.items()))
+        click.echo(f'{label}: {required} active required jobs; industry jobs {statuses or "none"}')
+
+@app.cli.command('shard-migrate')
+@click.option('--delete', is_flag=True, help='Delete the migrated rows from the main database.')
+def shard_migrate_command(delete):
+    """Move job data from the main database into per-corporation databases"""
+    if not shard_router.enabled:
+        raise click.ClickException('Set SHARD_BY_CORPORATION=1 to enable sharding first')
+    
+    required_job = RequiredJob.__table__
+    industry_job = IndustryJob.__table__
+    job_change = JobChange.__table__
+    job_assignment = JobAssignment.__table__
+    job_rollup = JobRollup.__table__
+    
+    with db.engine.connect() as source:
+        corporation_ids = sorted(
+            {row[0] for row in source.execute(db.select(required_job.c.corporation_id).distinct())} |
+            {row[0] for row in source.execute(db.select(industry_job.c.corporation_id).distinct())} |
+            {row[0] for row in source.execute(db.select(job_rollup.c.corporation_id).distinct())}
+        )
+        for corporation_id in corporation_ids:
+            required_ids = db.select(required_job.c.id).where(required_job.c.corporation_id == corporation_id)
+            selections = [
+                (required_job, required_job.c.corporation_id == corporation_id),
+                (industry_job, industry_job.c.corporation_id == corporation_id),
+                (job_change, job_change.c.corporation_id == corporation_id),
+                (job_assignment, job_assignment.c.required_job_id.in_(required_ids)),
+                (job_rollup, job_rollup.c.corporation_id == corporation_id),
+            ]
+            
+            # Rows keep their primary keys, so assignments still point at the right jobs and change
+            # log consumers can continue from their last ID; rows copied by an earlier run are skipped
+            with shard_router.engine(corporation_id).begin() as target:
+                for table, condition in selections:
+                    rows = source.execution_options(yield_per=INDUSTRY_JOB_EXPORT_CHUNK_SIZE).execute(
+                        db.select(table).where(condition)
+                    ).mappings()
+                    for chunk in rows.partitions():
+                        target.execute(sqlite_insert(table).on_conflict_do_nothing(), [dict(row) for row in chunk])
+            source.commit()  # End the read transaction so the main database can be written to
+            
+            if delete:
+                with db.engine.begin() as main:
+                    for table, condition in reversed(selections):
+                        main.execute(table.delete().where(condition))
+            click.echo(f'Migrated corporation {corporation_id}')
+
+def scheduled_sync(user_id):
+    """Sync a user whose industry jobs have just finished"""
+    with app.app_context():
+        user = db.session.get(User, user_id)
+        if user and user.is_active:
+            with corporation_shard(user.corporation_id):
+                # Jobs just finished, so a recent sync's result is outdated; only join a running one
+                sync_flights.do((user.id, user.corporation_id), lambda: sync_industry_jobs(user), min_interval=0)
+
+sync_scheduler = SyncScheduler(scheduled_sync)
+
+def schedule_job_completions(jobs):
+    """Schedule a sync for when each active job finishes, plus the ESI cache lag"""
+    # Other processes leave it to the re-check of the process running the scheduler
+    if not sync_scheduler.running:
+        return
+    lag = timedelta(seconds=app.config['SYNC_CACHE_LAG'])
+    now = datetime.utcnow()
+    for job in jobs:
+        if job.status == 'active' and job.end_date + lag > now:
+            sync_scheduler.schedule(job.installer_id, job.end_date + lag)
+
+def schedule_active_jobs():
+    """Schedule a sync for every installer's next active job from the database"""
+    lag = timedelta(seconds=app.config['SYNC_CACHE_LAG'])
+    now = datetime.utcnow()
+    def next_end_dates():
+        return db.session.query(
+            IndustryJob.installer_id, db.func.min(IndustryJob.end_date)
+        ).filter(IndustryJob.status == 'active').group_by(IndustryJob.installer_id).all()
+    
+    # Jobs that should have finished already (while the app was down, or ESI still
+    # reported them active at the last sync) are synced right away
+    for rows in shard_router.fan_out(app, next_end_dates).values():
+        for installer_id, end_date in rows:
+            sync_scheduler.schedule(installer_id, max(end_date + lag, now))
+
+# Lock file held by the process running the scheduler, and whether this process tried to take it
+sync_scheduler_lock = None
+sync_scheduler_attempted = False
+sync_scheduler_start_lock = threading.Lock()  # Concurrent first requests start it only once
+
+def start_sync_scheduler():
+    """Seed the scheduler from the database and start it, unless another process runs it"""
+    global sync_scheduler_lock, sync_scheduler_attempted
+    with sync_scheduler_start_lock:
+        if sync_scheduler_attempted:
+            return
+        sync_scheduler_attempted = True
+        
+        try:
+            import fcntl
+        except ImportError:
+            pass  # No file locks on Windows, where the app runs as a single process
+        else:
+            os.makedirs(app.instance_path, exist_ok=True)
+            sync_scheduler_lock = open(os.path.join(app.instance_path, 'sync-scheduler.lock'), 'w')
+            try:
+                fcntl.flock(sync_scheduler_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                sync_scheduler_lock.close()
+                sync_scheduler_lock = None
+                return
+        
+        schedule_active_jobs()
+        sync_scheduler.start(
+            recheck=schedule_active_jobs, recheck_interval=timedelta(seconds=app.config['SYNC_RECHECK_INTERVAL'])
+        )
+
+@app.before_request
+def ensure_sync_scheduler():
+    """Start the scheduler with the first request, so it also runs under WSGI servers"""
+    if app.config['SYNC_SCHEDULER'] and not sync_scheduler_attempted:
+        start_sync_scheduler()
+
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
+    if app.config['SYNC_SCHEDULER'] and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_sync_scheduler()
     app.run(debug=True)
\ No newline at end of file
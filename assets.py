@@ -0,0 +1,101 @@
+"""
+Fingerprinted, precompressed static assets.
+
+`build_assets` copies the CSS and JavaScript files under the static folder
+to `static/dist/`, with a hash of their content in the file name, next to
+gzip and (if the `brotli` package is installed) brotli compressed variants.
+A manifest maps the original names to the fingerprinted ones. Because a
+fingerprinted file never changes, browsers can cache it forever.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+
+DIST_DIRECTORY = 'dist'
+MANIFEST_NAME = 'manifest.json'
+EXTENSIONS = ('.css', '.js')
+
+# Content encodings of the precompressed variants, most preferred first
+ENCODINGS = {'br': '.br', 'gzip': '.gz'}
+
+
+def _compress(data):
+    variants = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    try:
+        import brotli
+    except ImportError:
+        pass
+    else:
+        variants['br'] = brotli.compress(data, quality=11)
+    return variants
+
+
+def build_assets(static_folder):
+    """
+    Fingerprint and compress the assets in a static folder, replacing any previous build.
+
+    :param str static_folder: Path of the static folder
+    :returns dict: The manifest, mapping original file names to fingerprinted ones
+    """
+    dist = os.path.join(static_folder, DIST_DIRECTORY)
+    manifest = {}
+    for root, directories, files in os.walk(static_folder):
+        directories[:] = [d for d in directories if os.path.join(root, d) != dist]
+        for name in sorted(files):
+            if not name.endswith(EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            with open(path, 'rb') as f:
+                data = f.read()
+            source = os.path.relpath(path, static_folder).replace(os.sep, '/')
+            stem, extension = os.path.splitext(source)
+            target = f'{DIST_DIRECTORY}/{stem}.{hashlib.sha256(data).hexdigest()[:12]}{extension}'
+
+            target_path = os.path.join(static_folder, target)
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            with open(target_path, 'wb') as f:
+                f.write(data)
+            for encoding, compressed in _compress(data).items():
+                # Only keep variants that are actually smaller
+                if len(compressed) < len(data):
+                    with open(target_path + ENCODINGS[encoding], 'wb') as f:
+                        f.write(compressed)
+            manifest[source] = target
+
+    # Remove the files of earlier builds
+    keep = {os.path.join(static_folder, target) for target in manifest.values()}
+    for root, _, files in os.walk(dist):
+        for name in files:
+            path = os.path.join(root, name)
+            base = next((path[:-len(suffix)] for suffix in ENCODINGS.values() if path.endswith(suffix)), path)
+            if base not in keep and name != MANIFEST_NAME:
+                os.remove(path)
+
+    with open(os.path.join(dist, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(static_folder):
+    """The manifest of the last build, or an empty dict if the assets were never built"""
+    try:
+        with open(os.path.join(static_folder, DIST_DIRECTORY, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def pick_encoding(path, accept_encodings):
+    """
+    Choose the precompressed variant of a built asset to send.
+
+    :param str path: Path of the asset
+    :param accept_encodings: Request's `Accept-Encoding` header, as parsed by Werkzeug
+    :returns tuple: The path to send and its content encoding, None if uncompressed
+    """
+    for encoding, suffix in ENCODINGS.items():
+        if accept_encodings[encoding] and os.path.exists(path + suffix):
+            return path + suffix, encoding
+    return path, None
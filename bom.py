@@ -0,0 +1,124 @@
+"""
+Bill of materials planning for a corporation's required jobs.
+
+Required jobs only say how many of a type to build. `BomPlanner` expands
+them through the blueprint data of an `SDEStore` into the jobs to run for
+every component and the raw materials to buy.
+
+Demand is aggregated across all requirements before anything is expanded.
+Types are then expanded deepest first, one build tree level at a time, so
+every component is expanded exactly once with the total quantity the
+corporation needs. That keeps the material efficiency rounding exact, and
+the cost depends on the number of distinct types rather than the number of
+requirements. Recipes and tree depths are memoized per type, and adding,
+changing or removing a requirement only adjusts the aggregated demand.
+"""
+
+import math
+from collections import Counter, defaultdict
+
+MANUFACTURING = 1
+REACTION = 11
+
+
+def material_quantity(base_quantity, runs, material_efficiency):
+    """
+    Quantity of a material needed for a number of runs.
+
+    :param int base_quantity: Quantity per run in the blueprint
+    :param int runs: Number of runs
+    :param int material_efficiency: Blueprint material efficiency, in percent
+    :returns int: The quantity, never less than one per run
+    """
+    return max(runs, math.ceil(round(base_quantity * runs * (1 - material_efficiency / 100), 2)))
+
+
+class BomPlanner:
+    def __init__(self, store, material_efficiency=10):
+        """
+        :param SDEStore store: Blueprint data
+        :param int material_efficiency: Material efficiency of all manufacturing blueprints, in percent
+        """
+        self.store = store
+        self.material_efficiency = material_efficiency
+        self._recipes = {}  # type_id -> (blueprint_type_id, activity_id, quantity per run, materials) or None
+        self._levels = {}  # type_id -> length of the longest path to a raw material
+        self._requirements = {}  # key -> (type_id, quantity)
+        self._demand = Counter()  # type_id -> units required, over all requirements
+        self._plan = None
+
+    def recipe(self, type_id):
+        """How a type is built, or None if it is bought"""
+        if type_id not in self._recipes:
+            recipe = None
+            blueprint_type_id = self.store.blueprint_for(type_id)
+            if blueprint_type_id:
+                for activity_id in (MANUFACTURING, REACTION):
+                    products = [quantity for product, quantity, _ in self.store.products(blueprint_type_id, activity_id) if product == type_id]
+                    if products:
+                        materials = self.store.materials(blueprint_type_id, activity_id)
+                        recipe = (blueprint_type_id, activity_id, products[0], materials)
+                        break
+            self._recipes[type_id] = recipe
+        return self._recipes[type_id]
+
+    def level(self, type_id):
+        """Depth of the build tree below a type; 0 for raw materials"""
+        level = self._levels.get(type_id)
+        if level is None:
+            self._levels[type_id] = 0  # Treats the type as raw if it is part of a cycle
+            recipe = self.recipe(type_id)
+            level = 1 + max((self.level(material) for material, _ in recipe[3]), default=0) if recipe else 0
+            self._levels[type_id] = level
+        return level
+
+    def set_requirement(self, key, type_id, quantity):
+        """Add a requirement, or replace the requirement with the same key"""
+        self.remove_requirement(key)
+        if quantity > 0:
+            self._requirements[key] = (type_id, quantity)
+            self._demand[type_id] += quantity
+            self._plan = None
+
+    def remove_requirement(self, key):
+        requirement = self._requirements.pop(key, None)
+        if requirement is not None:
+            type_id, quantity = requirement
+            self._demand[type_id] -= quantity
+            if not self._demand[type_id]:
+                del self._demand[type_id]
+            self._plan = None
+
+    def __len__(self):
+        return len(self._requirements)
+
+    def plan(self):
+        """
+        Expand the current requirements.
+
+        :returns dict: `jobs` maps each type to build to `(blueprint_type_id, activity_id, runs)`,
+            `materials` maps each type to buy to its quantity
+        """
+        if self._plan is None:
+            demand = Counter(self._demand)
+            by_level = defaultdict(set)
+            for type_id in demand:
+                by_level[self.level(type_id)].add(type_id)
+
+            jobs = {}
+            for level in range(max(by_level, default=0), 0, -1):
+                # Materials are always on a lower level, so their demand is complete before they are expanded
+                for type_id in by_level.pop(level, ()):
+                    blueprint_type_id, activity_id, quantity_per_run, materials = self.recipe(type_id)
+                    runs = math.ceil(demand[type_id] / quantity_per_run)
+                    jobs[type_id] = (blueprint_type_id, activity_id, runs)
+                    material_efficiency = self.material_efficiency if activity_id == MANUFACTURING else 0
+                    for material, base_quantity in materials:
+                        demand[material] += material_quantity(base_quantity, runs, material_efficiency)
+                        by_level[self.level(material)].add(material)
+
+            self._plan = {
+                'jobs': jobs,
+                'materials': {type_id: demand[type_id] for type_id in by_level.get(0, ())},
+            }
+        return self._plan
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+EVE Industry Tracker - SQL Query Budget Check
+
+Seeds a throwaway database with a realistic corporation, requests every
+route of the application through the Flask test client with ESI stubbed
+out, and counts and times the SQL statements each request runs. The check
+fails when a route runs more statements or takes longer than its budget in
+`BUDGETS`, or when a route has no budget, and prints the statements of the
+offending requests so N+1 queries are easy to spot. A server error fails
+the check too, except on the routes in `MISSING_TEMPLATES`.
+
+Usage:
+    python check_query_budgets.py [--verbose]
+
+Options:
+    --verbose   Print the statements of every route, not only failing ones
+"""
+
+import argparse
+import atexit
+import io
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from unittest import mock
+
+# Budgets per route: (method, URL, request options, maximum statements, maximum milliseconds).
+# Routes are requested in this order, after one warm-up pass over the GET routes, so the
+# counts are those of a running app whose caches are filled.
+BUDGETS = {
+    'static': ('GET', '/static/css/style.css', {}, 0, 100),
+    'index': ('GET', '/', {}, 0, 100),
+    'login': ('GET', '/login', {}, 0, 100),
+    'sso_callback': ('GET', '/sso/callback?state=budget&code=budget', {'session': {'oauth_state': 'budget'}}, 3, 250),
+    'dashboard': ('GET', '/dashboard', {}, 6, 250),
+    'required_jobs': ('GET', '/jobs/required', {}, 5, 250),
+    'industry_jobs': ('GET', '/jobs/industry', {}, 13, 1000),
+    'export_industry_jobs_route': ('GET', '/jobs/industry/export?format=ndjson', {}, 2, 1000),
+    'admin_panel': ('GET', '/admin', {}, 5, 250),
+    'create_required_job': ('POST', '/admin/jobs/create', {'data': {
+        'type_id': 587, 'type_name': 'Rifter', 'activity_id': 1, 'quantity_required': 10, 'priority': 'high'
+    }}, 7, 250),
+    'import_required_jobs_route': ('POST', '/admin/jobs/import?format=csv', {
+        'data': 'type_id,quantity_required,priority\n' + '587,5,low\n' * 500, 'content_type': 'text/csv'
+    }, 6, 1000),
+    'manage_users': ('GET', '/admin/users', {}, 3, 250),
+    'get_type_name': ('GET', '/api/types/587', {}, 0, 100),
+    'job_bom': ('GET', '/api/jobs/bom', {}, 4, 250),
+    'job_costs': ('GET', '/api/jobs/costs', {}, 3, 250),
+    'job_stats': ('GET', '/api/jobs/stats', {}, 3, 250),
+    'job_changes': ('GET', '/api/jobs/changes', {}, 4, 250),
+    'job_rollups': ('GET', '/api/jobs/rollups?group_by=installer_id,product_type_id', {}, 4, 250),
+    'login_stats': ('GET', '/api/login-stats', {}, 1, 100),
+    'profiles': ('GET', '/api/profiles', {}, 1, 100),
+    'profile_dump': ('GET', '/api/profiles/none.folded', {}, 1, 100),
+    'sync_stats': ('GET', '/api/sync-stats', {}, 1, 100),
+    'sync_jobs': ('POST', '/api/sync-jobs', {}, 11, 1000),
+    'logout': ('GET', '/logout', {}, 0, 100),
+}
+
+# Routes whose templates are not part of the repository yet, so they fail when rendering.
+# Their views run all their queries before rendering, so the budgets still apply.
+MISSING_TEMPLATES = {'industry_jobs', 'admin_panel', 'manage_users'}
+
+# Size of the seeded corporation
+CORPORATION_ID = 98000001
+MEMBERS = 25
+REQUIRED_JOBS = 300
+INDUSTRY_JOBS = 2000
+
+
+def configure_environment(directory):
+    """Point the application at a throwaway database and SDE store before it is imported"""
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(directory, 'budget.db')}"
+    os.environ['SDE_STORE_PATH'] = os.path.join(directory, 'sde.bin')
+    os.environ['MARKET_DATA_PATH'] = os.path.join(directory, 'market.npz')
+    os.environ['SHARD_BY_CORPORATION'] = ''
+    os.environ['PROFILE'] = ''
+    # Every sync request should really sync, not reuse the previous one
+    os.environ['SYNC_MIN_INTERVAL'] = '0'
+    os.environ['SYNC_SCHEDULER'] = ''
+
+
+def esi_job(job_id, installer, status, now):
+    start = now - timedelta(hours=job_id % 48)
+    return {
+        'job_id': job_id, 'installer_id': installer, 'facility_id': 1021000000000, 'station_id': 60003760,
+        'activity_id': 1, 'blueprint_id': 1000000000 + job_id, 'blueprint_type_id': 691,
+        'blueprint_location_id': 60003760, 'output_location_id': 60003760, 'runs': 10, 'product_type_id': 587,
+        'status': status, 'duration': 86400, 'start_date': start.strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'end_date': (start + timedelta(days=1)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+    }
+
+
+class FakeResponse:
+    def __init__(self, status_code, data=None, headers=None):
+        self.status_code = status_code
+        self._data = data
+        self.headers = headers or {}
+
+    def json(self):
+        return self._data
+
+
+class FakeESI:
+    """
+    Canned ESI and SSO responses; the corporation's jobs move on a little on every sync. Like the
+    real ESI, delivered jobs are only listed when `include_completed` is requested.
+    """
+
+    def __init__(self, admin_character_id):
+        self.admin_character_id = admin_character_id
+        self.now = datetime.utcnow()
+        self.syncs = 0
+
+    def get(self, url, headers=None, params=None, **kwargs):
+        if url.endswith('/industry/jobs/') and '/corporations/' in url:
+            self.syncs += 1
+            # Jobs from the seeded history, with a few finishing and a few new ones per sync
+            jobs = [esi_job(job_id, self.admin_character_id, 'active', self.now) for job_id in range(1, 301)]
+            for job in jobs[:self.syncs * 5]:
+                job['status'] = 'delivered'
+            jobs += [esi_job(INDUSTRY_JOBS + self.syncs * 10 + i, self.admin_character_id, 'active', self.now) for i in range(10)]
+            if (params or {}).get('include_completed') != 'true':
+                jobs = [job for job in jobs if job['status'] != 'delivered']
+            return FakeResponse(200, jobs)
+        if url.endswith('/industry/jobs/'):
+            return FakeResponse(200, [])
+        if '/universe/types/' in url:
+            return FakeResponse(200, {'name': 'Rifter'})
+        if url.endswith('/markets/prices/'):
+            return FakeResponse(200, [
+                {'type_id': 34, 'adjusted_price': 4.1, 'average_price': 4.0},
+                {'type_id': 587, 'adjusted_price': 120000.0, 'average_price': 150000.0},
+            ])
+        if url.endswith('/industry/systems/'):
+            return FakeResponse(200, [
+                {'solar_system_id': 30000142, 'cost_indices': [{'activity': 'manufacturing', 'cost_index': 0.05}]}
+            ])
+        return FakeResponse(404)
+
+    def post(self, url, headers=None, json=None, data=None, **kwargs):
+        if 'oauth/token' in url:
+            import jwt
+            token = jwt.encode({'sub': f'CHARACTER:EVE:{self.admin_character_id}', 'name': 'Budget Admin'}, 'budget' * 8)
+            return FakeResponse(200, {'access_token': token, 'refresh_token': 'budget', 'expires_in': 1200})
+        if url.endswith('/universe/names/'):
+            return FakeResponse(200, [{'id': i, 'name': f'Name {i}', 'category': 'inventory_type'} for i in json])
+        if url.endswith('/universe/ids/'):
+            return FakeResponse(200, {'inventory_types': [{'id': 587, 'name': name} for name in json]})
+        if url.endswith('/characters/affiliation/'):
+            return FakeResponse(200, [{'character_id': i, 'corporation_id': CORPORATION_ID} for i in json])
+        return FakeResponse(404)
+
+
+def seed(app_module):
+    """Create the tables, a small SDE store and a corporation with members, required jobs and job history"""
+    from sde_store import build_store
+
+    app, db = app_module.app, app_module.db
+    build_store(
+        {34: {'name': {'en': 'Tritanium'}}, 587: {'name': {'en': 'Rifter'}}, 691: {'name': {'en': 'Rifter Blueprint'}}},
+        {691: {'activities': {'manufacturing': {
+            'materials': [{'typeID': 34, 'quantity': 32000}], 'products': [{'typeID': 587, 'quantity': 1}]
+        }}}},
+        app.config['SDE_STORE_PATH'],
+    )
+
+    now = datetime.utcnow()
+    with app.app_context():
+        db.create_all()
+        users = [
+            app_module.User(
+                character_id=2112000000 + i, character_name=f'Member {i}', corporation_id=CORPORATION_ID,
+                corporation_name='Budget Corporation', is_admin=i == 0, access_token='budget',
+                refresh_token='budget', token_expires=now + timedelta(days=1)
+            )
+            for i in range(MEMBERS)
+        ]
+        db.session.add_all(users)
+        db.session.flush()
+
+        db.session.bulk_insert_mappings(app_module.RequiredJob, [
+            dict(corporation_id=CORPORATION_ID, type_id=587, type_name='Rifter', activity_id=1,
+                 quantity_required=10 + i % 50, priority=('low', 'medium', 'high', 'critical')[i % 4],
+                 deadline=now + timedelta(days=i % 30), created_by=users[0].id, created_at=now, is_active=True)
+            for i in range(REQUIRED_JOBS)
+        ])
+        statuses = ('active', 'delivered', 'ready', 'cancelled')
+        db.session.bulk_insert_mappings(app_module.IndustryJob, [
+            dict(job_id=job_id, installer_id=users[job_id % MEMBERS].id,
+                 installer_character_id=users[job_id % MEMBERS].character_id, facility_id=1021000000000,
+                 station_id=60003760, activity_id=1, blueprint_id=1000000000 + job_id, blueprint_type_id=691,
+                 blueprint_location_id=60003760, output_location_id=60003760, runs=10, product_type_id=587,
+                 status='active' if job_id <= 300 else statuses[job_id % 4], duration=86400,
+                 start_date=now - timedelta(hours=job_id % 48), end_date=now - timedelta(hours=job_id % 48) + timedelta(days=1),
+                 corporation_id=CORPORATION_ID, created_at=now, updated_at=now)
+            for job_id in range(1, INDUSTRY_JOBS + 1)
+        ])
+        db.session.bulk_insert_mappings(app_module.JobChange, [
+            dict(job_id=job_id, corporation_id=CORPORATION_ID, old_status=None, new_status='active', changed_at=now)
+            for job_id in range(1, INDUSTRY_JOBS + 1)
+        ])
+        db.session.commit()
+        return users[0].character_id
+
+
+class StatementRecorder:
+    """Records the SQL statements run by the current thread while `recording` is set"""
+
+    def __init__(self):
+        self.recording = False
+        self.thread_id = None
+        self.statements = []  # (statement, seconds)
+
+    def install(self):
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+
+        event.listen(Engine, 'before_cursor_execute', self._before)
+        event.listen(Engine, 'after_cursor_execute', self._after)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        if self.recording and threading.get_ident() == self.thread_id:
+            conn.info['budget_started'] = time.perf_counter()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop('budget_started', None)
+        if started is not None:
+            self.statements.append((statement, time.perf_counter() - started))
+
+    def start(self):
+        self.statements = []
+        self.thread_id = threading.get_ident()
+        self.recording = True
+
+    def stop(self):
+        self.recording = False
+        return self.statements
+
+
+def request(client, method, url, options):
+    session_values = options.get('session')
+    if session_values:
+        with client.session_transaction() as session:
+            session.update(session_values)
+    kwargs = {key: value for key, value in options.items() if key != 'session'}
+    if isinstance(kwargs.get('data'), str):
+        kwargs['data'] = io.BytesIO(kwargs['data'].encode())
+    response = client.open(url, method=method, **kwargs)
+    response.get_data()  # Consume streamed responses, whose queries run while streaming
+    return response
+
+
+def print_statements(statements):
+    # Group statements that only differ in their parameters, most frequent first
+    grouped = Counter(re.sub(r'\s+', ' ', statement).strip() for statement, _ in statements)
+    for statement, count in grouped.most_common():
+        print(f'      {count:>4} x {statement[:200]}')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Check the SQL statement and latency budgets of every route',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__
+    )
+    parser.add_argument('--verbose', action='store_true', help='Print the statements of every route')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='query-budget-')
+    atexit.register(shutil.rmtree, directory, True)
+    configure_environment(directory)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app as app_module
+
+    app = app_module.app
+    app.config['PROPAGATE_EXCEPTIONS'] = False
+    app.logger.disabled = True  # Server errors show up in the status column instead
+    admin_character_id = seed(app_module)
+    esi = FakeESI(admin_character_id)
+    recorder = StatementRecorder()
+    recorder.install()
+
+    failures = []
+    routes = {rule.endpoint for rule in app.url_map.iter_rules()}
+    for endpoint in sorted(routes - set(BUDGETS)):
+        failures.append(f'{endpoint}: no query budget declared')
+
+    with mock.patch.object(app_module.requests, 'get', esi.get), mock.patch.object(app_module.requests, 'post', esi.post):
+        client = app.test_client()
+
+        def log_in():
+            with client.session_transaction() as session:
+                session['character_id'] = admin_character_id
+                # Flashes of redirects that were not followed would disable conditional responses
+                session.pop('_flashes', None)
+
+        log_in()
+        for endpoint, (method, url, options, _, _) in BUDGETS.items():
+            if method == 'GET' and endpoint != 'logout':
+                request(client, method, url, options)
+                log_in()
+
+        print(f"{'Route':<28} {'Status':>6} {'Queries':>12} {'Milliseconds':>16}")
+        for endpoint, (method, url, options, max_queries, max_ms) in BUDGETS.items():
+            if endpoint not in routes:
+                failures.append(f'{endpoint}: budget declared for a route that does not exist')
+                continue
+            log_in()
+            recorder.start()
+            started = time.perf_counter()
+            response = request(client, method, url, options)
+            elapsed = (time.perf_counter() - started) * 1000
+            statements = recorder.stop()
+
+            problems = []
+            if len(statements) > max_queries:
+                problems.append(f'{len(statements)} statements, budget {max_queries}')
+            if elapsed > max_ms:
+                problems.append(f'{elapsed:.0f} ms, budget {max_ms} ms')
+            if response.status_code >= 500 and endpoint not in MISSING_TEMPLATES:
+                problems.append(f'status {response.status_code}')
+            print(f'{endpoint:<28} {response.status_code:>6} {len(statements):>5} / {max_queries:<4} {elapsed:>7.1f} / {max_ms:<6}'
+                  + ('  FAIL' if problems else ''))
+            if problems:
+                failures.append(f"{endpoint}: {', '.join(problems)}")
+            if problems or args.verbose:
+                print_statements(statements)
+
+    if failures:
+        print('\n❌ Query budget check failed:')
+        for failure in failures:
+            print(f'   - {failure}')
+        sys.exit(1)
+    print('\n✓ All routes are within their query budgets')
+
+
+if __name__ == '__main__':
+    main()
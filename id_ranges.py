@@ -0,0 +1,35 @@
+# This file is generated from docs/guides/id-ranges.md by scripts/generate-id-ranges.py.
+# Do not edit it by hand; update the guide instead.
+"""
+Classifies EVE IDs by the numeric range they fall in.
+
+Ranges are looked up with a binary search over the sorted range starts, either
+for a single ID with `classify`, or for a NumPy array of IDs with `classify_array`.
+"""
+
+from bisect import bisect_right
+
+STARTS = (0, 500000, 1000000, 3000000, 9000000, 10000000, 20000000, 30000000, 40000000, 50000000, 60000000, 70000000, 80000000, 81000000, 82000000, 90000000, 98000000, 99000000, 100000000, 2100000000, 2112000000, 1000000000000)
+ENDS = (499999, 599999, 1999999, 3999999, 9999999, 19999999, 29999999, 39999999, 49999999, 59999999, 69999999, 79999999, 80099999, 81999999, 84999999, 97999999, 98999999, 99999999, 2099999999, 2111999999, 2129999999, None)
+KINDS = ('various', 'faction', 'npc_corporation', 'npc_character', 'universe', 'region', 'constellation', 'solar_system', 'celestial', 'stargate', 'station', 'asteroid', 'control_bunker', 'promenade', 'planetary_district', 'character', 'corporation', 'alliance', 'legacy_entity', 'character', 'character', 'item')
+DESCRIPTIONS = ('Various', 'Factions', 'NPC corporations', 'NPC characters (agents and NPC corporation CEOs)', 'Universes', 'Regions', 'Constellations', 'Solar systems', 'Celestials (suns, planets, moons, asteroid belts)', 'Stargates', 'Stations', 'Asteroids', 'Control Bunkers', 'WiS Promenades', 'Planetary Districts', 'EVE characters created between 2010-11-03 and 2016-05-30', 'EVE corporations created after 2010-11-03', 'EVE alliances created after 2010-11-03', 'EVE characters, corporations and alliances created before 2010-11-03', 'EVE / DUST characters created after 2016-05-30', 'EVE characters created after 2016-05-30', 'Spawned items')
+
+
+def classify(entity_id):
+    """Return the kind of `entity_id`, or None if it is not in any documented range."""
+    i = bisect_right(STARTS, entity_id) - 1
+    if i < 0 or (ENDS[i] is not None and entity_id > ENDS[i]):
+        return None
+    return KINDS[i]
+
+
+def classify_array(entity_ids):
+    """Return an object array with the kind of every ID in `entity_ids` (None if unknown)."""
+    import numpy as np
+
+    entity_ids = np.asarray(entity_ids, dtype=np.int64)
+    ends = np.array([np.iinfo(np.int64).max if end is None else end for end in ENDS], dtype=np.int64)
+    i = np.searchsorted(np.array(STARTS, dtype=np.int64), entity_ids, side='right') - 1
+    known = (i >= 0) & (entity_ids <= ends[np.maximum(i, 0)])
+    kinds = np.array(KINDS + (None,), dtype=object)
+    return kinds[np.where(known, i, len(KINDS))]
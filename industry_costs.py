@@ -0,0 +1,205 @@
+"""
+Market prices, industry cost indices and job cost estimates.
+
+`MarketData` holds the bulk `/markets/prices/` and `/industry/systems/`
+datasets as sorted NumPy arrays, so prices of many types are looked up at
+once with a binary search. `CostEstimator` uses it, with blueprint data
+from an `SDEStore`, to estimate the install cost, material value and
+product value of any number of jobs in one vectorized pass.
+
+Install costs follow the game's formula: the estimated item value (the
+adjusted price of the blueprint's unmodified materials) times the sum of
+the system cost index, the facility tax and the SCC surcharge.
+"""
+
+from datetime import datetime
+
+import numpy as np
+
+from bom import MANUFACTURING, REACTION
+
+# Cost index activities in /industry/systems/, stored in this column order
+COST_INDEX_ACTIVITIES = (
+    'manufacturing', 'researching_time_efficiency', 'researching_material_efficiency',
+    'copying', 'invention', 'reaction',
+)
+ACTIVITY_COLUMNS = {1: 0, 3: 1, 4: 2, 5: 3, 8: 4, 11: 5}
+
+# Surcharge added to every job's install cost, as a fraction of the estimated item value
+SCC_SURCHARGE = 0.04
+
+
+class MarketData:
+    def __init__(self, type_ids, adjusted_prices, average_prices, system_ids, cost_indices, expires):
+        """
+        :param type_ids: Sorted type IDs, with their prices at the same positions
+        :param system_ids: Sorted solar system IDs, with a row of `cost_indices` each
+        :param datetime expires: When ESI's cache of the datasets expires, naive UTC
+        """
+        self.type_ids = np.asarray(type_ids, dtype=np.int32)
+        self.adjusted_prices = np.asarray(adjusted_prices, dtype=np.float64)
+        self.average_prices = np.asarray(average_prices, dtype=np.float64)
+        self.system_ids = np.asarray(system_ids, dtype=np.int32)
+        self.cost_indices = np.asarray(cost_indices, dtype=np.float64).reshape(-1, len(COST_INDEX_ACTIVITIES))
+        self.expires = expires
+
+    @classmethod
+    def from_esi(cls, prices, systems, expires):
+        """Build from the JSON of /markets/prices/ and /industry/systems/"""
+        prices = sorted(prices, key=lambda entry: entry['type_id'])
+        systems = sorted(systems, key=lambda entry: entry['solar_system_id'])
+        cost_indices = np.zeros((len(systems), len(COST_INDEX_ACTIVITIES)))
+        for row, system in enumerate(systems):
+            for entry in system['cost_indices']:
+                if entry['activity'] in COST_INDEX_ACTIVITIES:
+                    cost_indices[row, COST_INDEX_ACTIVITIES.index(entry['activity'])] = entry['cost_index']
+        return cls(
+            [entry['type_id'] for entry in prices],
+            [entry.get('adjusted_price', 0.0) for entry in prices],
+            [entry.get('average_price', 0.0) for entry in prices],
+            [system['solar_system_id'] for system in systems],
+            cost_indices,
+            expires,
+        )
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            np.savez(
+                f, type_ids=self.type_ids, adjusted_prices=self.adjusted_prices, average_prices=self.average_prices,
+                system_ids=self.system_ids, cost_indices=self.cost_indices,
+                expires=np.array(self.expires.isoformat()),
+            )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(
+                data['type_ids'], data['adjusted_prices'], data['average_prices'],
+                data['system_ids'], data['cost_indices'], datetime.fromisoformat(str(data['expires'])),
+            )
+
+    @property
+    def expired(self):
+        return datetime.utcnow() >= self.expires
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in (
+            self.type_ids, self.adjusted_prices, self.average_prices, self.system_ids, self.cost_indices
+        ))
+
+    def prices(self, type_ids, kind='average'):
+        """Prices of an array of type IDs; 0 for types without a price"""
+        prices = self.average_prices if kind == 'average' else self.adjusted_prices
+        type_ids = np.asarray(type_ids, dtype=np.int32)
+        if not len(self.type_ids):
+            return np.zeros(type_ids.shape)
+        position = np.minimum(np.searchsorted(self.type_ids, type_ids), len(self.type_ids) - 1)
+        return np.where(self.type_ids[position] == type_ids, prices[position], 0.0)
+
+    def cost_index(self, system_id, activity_id):
+        """Cost index of an activity in a solar system; 0 if the system has none"""
+        position = np.searchsorted(self.system_ids, system_id)
+        if position == len(self.system_ids) or self.system_ids[position] != system_id:
+            return 0.0
+        return float(self.cost_indices[position, ACTIVITY_COLUMNS.get(activity_id, 0)])
+
+
+class CostEstimator:
+    def __init__(self, store):
+        """
+        :param SDEStore store: Blueprint data
+        """
+        self.store = store
+        self._blueprints = {}  # blueprint_type_id -> (activity_id, product, quantity per run, material types, quantities)
+
+    def blueprint(self, blueprint_type_id):
+        """What a blueprint makes and needs per run, memoized; None if it makes nothing"""
+        if blueprint_type_id not in self._blueprints:
+            recipe = None
+            for activity_id in (MANUFACTURING, REACTION):
+                products = self.store.products(blueprint_type_id, activity_id)
+                if products:
+                    materials = self.store.materials(blueprint_type_id, activity_id)
+                    recipe = (
+                        activity_id, products[0][0], products[0][1],
+                        np.array([material for material, _ in materials], dtype=np.int32),
+                        np.array([quantity for _, quantity in materials], dtype=np.int64),
+                    )
+                    break
+            self._blueprints[blueprint_type_id] = recipe
+        return self._blueprints[blueprint_type_id]
+
+    def runs_for(self, product_type_ids, quantities):
+        """
+        Blueprints and runs needed to build quantities of products.
+
+        :returns tuple: Arrays of blueprint type IDs (0 if a product can't be built) and runs
+        """
+        blueprint_type_ids = np.zeros(len(product_type_ids), dtype=np.int32)
+        runs = np.zeros(len(product_type_ids), dtype=np.int64)
+        per_run = {}
+        for product in set(product_type_ids):
+            blueprint_type_id = self.store.blueprint_for(product)
+            recipe = self.blueprint(blueprint_type_id) if blueprint_type_id else None
+            per_run[product] = (blueprint_type_id, recipe[2]) if recipe else (0, 1)
+        for i, (product, quantity) in enumerate(zip(product_type_ids, quantities)):
+            blueprint_type_ids[i], quantity_per_run = per_run[product]
+            runs[i] = -(-quantity // quantity_per_run) if blueprint_type_ids[i] else 0
+        return blueprint_type_ids, runs
+
+    def estimate(self, market, blueprint_type_ids, runs, system_id, material_efficiency=10, facility_tax=0.0):
+        """
+        Estimate the costs of jobs.
+
+        :param MarketData market: Prices and cost indices
+        :param blueprint_type_ids: Array with the blueprint of each job; blueprints that make nothing give zeros
+        :param runs: Array with the runs of each job
+        :param int system_id: Solar system the jobs are installed in
+        :param int material_efficiency: Material efficiency of manufacturing blueprints, in percent
+        :param float facility_tax: Facility tax, as a fraction of the estimated item value
+        :returns dict: Arrays of `install_cost`, `material_value` (materials at average prices,
+            after material efficiency) and `product_value` (output at average prices)
+        """
+        blueprint_type_ids = np.asarray(blueprint_type_ids, dtype=np.int32)
+        runs = np.asarray(runs, dtype=np.int64)
+        unique, job_blueprint = np.unique(blueprint_type_ids, return_inverse=True)
+
+        # Materials of the distinct blueprints, concatenated, with each blueprint's slice in `offsets`
+        recipes = [self.blueprint(int(blueprint_type_id)) if blueprint_type_id else None for blueprint_type_id in unique]
+        empty = np.zeros(0, dtype=np.int64)
+        material_types = np.concatenate([empty] + [recipe[3] if recipe else empty for recipe in recipes]).astype(np.int32)
+        material_quantities = np.concatenate([empty] + [recipe[4] if recipe else empty for recipe in recipes])
+        counts = np.array([len(recipe[3]) if recipe else 0 for recipe in recipes], dtype=np.int64)
+        offsets = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.int64)
+        activities = np.array([recipe[0] if recipe else 0 for recipe in recipes], dtype=np.int64)
+        products = np.array([recipe[1] if recipe else 0 for recipe in recipes], dtype=np.int32)
+        product_quantities = np.array([recipe[2] if recipe else 0 for recipe in recipes], dtype=np.int64)
+
+        # Estimated item value of one run of each blueprint
+        material_adjusted = material_quantities * market.prices(material_types, 'adjusted')
+        value_per_run = np.bincount(
+            np.repeat(np.arange(len(unique)), counts), weights=material_adjusted, minlength=len(unique)
+        )
+        rates = np.array([
+            market.cost_index(system_id, activity_id) + facility_tax + SCC_SURCHARGE if activity_id else 0.0
+            for activity_id in activities
+        ])
+        install_cost = value_per_run[job_blueprint] * runs * rates[job_blueprint]
+
+        # One row per (job, material), as material efficiency rounding depends on the runs
+        job_counts = counts[job_blueprint]
+        rows = np.repeat(np.arange(len(runs)), job_counts)
+        first = np.repeat(offsets[job_blueprint] - np.concatenate(([0], np.cumsum(job_counts)[:-1])), job_counts)
+        materials = first + np.arange(len(rows))
+        row_runs = runs[rows]
+        efficiency = np.where(activities[job_blueprint][rows] == MANUFACTURING, material_efficiency / 100, 0.0)
+        quantities = np.maximum(
+            row_runs, np.ceil(np.round(material_quantities[materials] * row_runs * (1 - efficiency), 2))
+        )
+        material_value = np.bincount(
+            rows, weights=quantities * market.prices(material_types[materials]), minlength=len(runs)
+        ).astype(np.float64)
+
+        product_value = runs * product_quantities[job_blueprint] * market.prices(products[job_blueprint])
+        return {'install_cost': install_cost, 'material_value': material_value, 'product_value': product_value}
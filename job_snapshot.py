@@ -0,0 +1,140 @@
+"""
+Columnar in-memory snapshot of a corporation's industry jobs.
+
+Dashboards only need a few columns of each job for filtering, sorting and
+counting, so instead of loading full ORM objects the snapshot keeps those
+columns in NumPy arrays, sorted by job ID. It is built once per corporation
+and patched with the jobs each sync touches.
+"""
+
+from datetime import datetime
+
+import numpy as np
+
+# Job statuses, stored as their index in this tuple
+STATUSES = ('active', 'paused', 'ready', 'delivered', 'cancelled', 'reverted')
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+
+EPOCH = datetime(1970, 1, 1)
+
+COLUMNS = {
+    'job_id': np.int64,
+    'installer_id': np.int32,
+    'activity_id': np.int8,
+    'blueprint_type_id': np.int32,
+    'product_type_id': np.int32,  # 0 if unknown
+    'status': np.int8,
+    'runs': np.int32,
+    'start_date': np.int64,  # Seconds since the epoch, UTC
+    'end_date': np.int64,
+}
+
+# Model attributes the snapshot is built from
+SOURCE_COLUMNS = list(COLUMNS)
+
+
+def to_timestamp(value):
+    return int((value.replace(tzinfo=None) - EPOCH).total_seconds())
+
+
+def _values(job):
+    return (
+        job.job_id,
+        job.installer_id,
+        job.activity_id,
+        job.blueprint_type_id,
+        job.product_type_id or 0,
+        STATUS_CODES.get(job.status, -1),
+        job.runs,
+        to_timestamp(job.start_date),
+        to_timestamp(job.end_date),
+    )
+
+
+class JobSnapshot:
+    def __init__(self, jobs=()):
+        """Build a snapshot from objects or rows with the `SOURCE_COLUMNS` attributes"""
+        rows = [_values(job) for job in jobs]
+        self.columns = {
+            name: np.array([row[i] for row in rows], dtype=dtype)
+            for i, (name, dtype) in enumerate(COLUMNS.items())
+        }
+        self._sort()
+
+    def __len__(self):
+        return len(self.columns['job_id'])
+
+    def _sort(self):
+        order = np.argsort(self.columns['job_id'], kind='stable')
+        self.columns = {name: column[order] for name, column in self.columns.items()}
+
+    @property
+    def nbytes(self):
+        """Memory used by the columns, in bytes"""
+        return sum(column.nbytes for column in self.columns.values())
+
+    def upsert(self, jobs):
+        """Update jobs that are already in the snapshot and add new ones"""
+        patch = JobSnapshot(jobs)
+        if not len(patch):
+            return
+
+        job_ids = self.columns['job_id']
+        position = np.minimum(np.searchsorted(job_ids, patch.columns['job_id']), max(len(self) - 1, 0))
+        existing = (job_ids[position] == patch.columns['job_id']) if len(self) else np.zeros(len(patch), dtype=bool)
+
+        for name, column in self.columns.items():
+            column[position[existing]] = patch.columns[name][existing]
+        if not existing.all():
+            self.columns = {
+                name: np.concatenate((column, patch.columns[name][~existing]))
+                for name, column in self.columns.items()
+            }
+            self._sort()
+
+    def mask(self, status=None, activity_id=None, installer_id=None, ending_after=None, ending_before=None):
+        """Boolean mask of the jobs matching all given filters; `status` may be a name or a list of names"""
+        mask = np.ones(len(self), dtype=bool)
+        if status is not None:
+            statuses = [status] if isinstance(status, str) else status
+            mask &= np.isin(self.columns['status'], [STATUS_CODES.get(s, -1) for s in statuses])
+        if activity_id is not None:
+            mask &= self.columns['activity_id'] == activity_id
+        if installer_id is not None:
+            mask &= self.columns['installer_id'] == installer_id
+        if ending_after is not None:
+            mask &= self.columns['end_date'] >= to_timestamp(ending_after)
+        if ending_before is not None:
+            mask &= self.columns['end_date'] < to_timestamp(ending_before)
+        return mask
+
+    def job_ids(self, order_by='end_date', descending=False, limit=None, **filters):
+        """Job IDs of the matching jobs, sorted by a column"""
+        selected = np.flatnonzero(self.mask(**filters))
+        order = np.argsort(self.columns[order_by][selected], kind='stable')
+        if descending:
+            order = order[::-1]
+        return self.columns['job_id'][selected[order[:limit]]].tolist()
+
+    def count_by(self, column, **filters):
+        """Number of matching jobs per distinct value of `column`"""
+        selected = self.columns[column][self.mask(**filters)]
+        if selected.dtype == np.int8:
+            # Small code columns are counted with a histogram instead of sorting
+            histogram = np.bincount(selected.astype(np.int16) + 128, minlength=256)
+            values = np.flatnonzero(histogram)
+            values, counts = values - 128, histogram[values]
+        else:
+            values, counts = np.unique(selected, return_counts=True)
+        if column == 'status':
+            values = [STATUSES[value] if value >= 0 else 'unknown' for value in values]
+        else:
+            values = values.tolist()
+        return dict(zip(values, counts.tolist()))
+
+    def sum_by(self, column, value='runs', **filters):
+        """Sum of `value` over the matching jobs per distinct value of `column`"""
+        mask = self.mask(**filters)
+        keys, inverse = np.unique(self.columns[column][mask], return_inverse=True)
+        sums = np.bincount(inverse, weights=self.columns[value][mask], minlength=len(keys))
+        return dict(zip(keys.tolist(), sums.astype(np.int64).tolist()))
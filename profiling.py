@@ -0,0 +1,216 @@
+"""
+On-demand request profiling.
+
+A profiled request is sampled from a background thread every few
+milliseconds, and the collected stacks are written in the folded format
+read by flamegraph.pl, speedscope and similar tools. Time spent in SQL
+queries and in HTTP calls to ESI is measured separately, and shows up in
+the flame graph as `[sql]` and `[esi]` frames on top of the stacks that
+issued them. Requests slower than `PROFILE_SLOW_MS` are kept in a ring
+buffer with their totals.
+
+The SQL and HTTP instrumentation is only installed when the first request
+is profiled, so an app that never profiles pays nothing for it.
+"""
+
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+
+from flask import g, request
+
+# Profile of the request running in the current thread, if it is being profiled
+_local = threading.local()
+
+
+class _Profile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stacks = Counter()
+        self.current_io = None  # '[sql]' or '[esi]' while the request waits on one
+        self.sql_time = 0.0
+        self.sql_queries = 0
+        self.esi_time = 0.0
+        self.esi_calls = 0
+
+    def measure(self, kind, duration):
+        if kind == '[sql]':
+            self.sql_time += duration
+            self.sql_queries += 1
+        else:
+            self.esi_time += duration
+            self.esi_calls += 1
+
+
+class _Sampler(threading.Thread):
+    def __init__(self, thread_id, profile, interval):
+        super().__init__(name='request-profiler', daemon=True)
+        self.thread_id = thread_id
+        self.profile = profile
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            stack.reverse()
+            if self.profile.current_io:
+                stack.append(self.profile.current_io)
+            self.profile.stacks[';'.join(stack)] += 1
+
+
+def _current_profile():
+    return getattr(_local, 'profile', None)
+
+
+class RequestProfiler:
+    def __init__(self):
+        self.app = None
+        self.slow_requests = deque()
+        self._requested = None
+        self._installed = False
+        self._lock = threading.Lock()
+        self._dump_ids = itertools.count(1)
+
+    def init_app(self, app, requested=None):
+        """
+        :param app: The Flask app
+        :param requested: Function telling whether the current request asked to be profiled,
+            called only when the request has a `profile` argument
+        """
+        self.app = app
+        self._requested = requested
+        app.config.setdefault('PROFILE', False)
+        app.config.setdefault('PROFILE_ROUTES', [])
+        app.config.setdefault('PROFILE_SLOW_MS', 500)
+        app.config.setdefault('PROFILE_INTERVAL_MS', 5)
+        app.config.setdefault('PROFILE_DIRECTORY', os.path.join(app.instance_path, 'profiles'))
+        self.slow_requests = deque(maxlen=app.config.get('PROFILE_HISTORY', 50))
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._stop)
+
+    def _explicitly_requested(self):
+        return 'profile' in request.args and self._requested is not None and bool(self._requested())
+
+    def _selected(self, requested):
+        config = self.app.config
+        if requested:
+            return True
+        if not config['PROFILE']:
+            return False
+        routes = config['PROFILE_ROUTES']
+        return not routes or request.endpoint in routes or any(
+            route.startswith('/') and request.path.startswith(route) for route in routes
+        )
+
+    def _install(self):
+        # Time SQL queries and HTTP requests of profiled requests, on first use only
+        with self._lock:
+            if self._installed:
+                return
+            import requests
+            from sqlalchemy import event
+            from sqlalchemy.engine import Engine
+
+            def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+                profile = _current_profile()
+                if profile is not None:
+                    conn.info.setdefault('profile_started', []).append(time.perf_counter())
+                    profile.current_io = '[sql]'
+
+            def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+                profile = _current_profile()
+                if profile is not None and conn.info.get('profile_started'):
+                    profile.measure('[sql]', time.perf_counter() - conn.info['profile_started'].pop())
+                    profile.current_io = None
+
+            event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+
+            send = requests.Session.send
+
+            def timed_send(session, prepared_request, **kwargs):
+                profile = _current_profile()
+                if profile is None:
+                    return send(session, prepared_request, **kwargs)
+                started = time.perf_counter()
+                profile.current_io = '[esi]'
+                try:
+                    return send(session, prepared_request, **kwargs)
+                finally:
+                    profile.current_io = None
+                    profile.measure('[esi]', time.perf_counter() - started)
+
+            requests.Session.send = timed_send
+            self._installed = True
+
+    def _start(self):
+        if not self.app.config['PROFILE'] and 'profile' not in request.args:
+            return
+        # A `profile` argument only counts if `requested` accepts it, also when PROFILE profiles the request anyway
+        requested = self._explicitly_requested()
+        if not self._selected(requested):
+            return
+        self._install()
+        g.profile_requested = requested
+        profile = _local.profile = _Profile()
+        g.profile_sampler = _Sampler(threading.get_ident(), profile, self.app.config['PROFILE_INTERVAL_MS'] / 1000)
+        g.profile_sampler.start()
+
+    def _stop(self, exception=None):
+        sampler = g.pop('profile_sampler', None)
+        if sampler is not None:
+            sampler.stopped.set()
+            sampler.join()  # So the stacks are no longer written to while they are read
+        _local.profile = None
+
+    def _finish(self, response):
+        profile = _current_profile()
+        if profile is None:
+            return response
+        self._stop()
+        duration = time.perf_counter() - profile.started
+
+        # Added to any timings the view reported itself
+        response.headers['Server-Timing'] = ', '.join(response.headers.getlist('Server-Timing') + [
+            f'app;dur={duration * 1000:.1f}',
+            f'sql;dur={profile.sql_time * 1000:.1f};desc="{profile.sql_queries} queries"',
+            f'esi;dur={profile.esi_time * 1000:.1f};desc="{profile.esi_calls} calls"',
+        ])
+
+        # Explicitly requested profiles are always kept, otherwise only slow requests
+        if duration * 1000 < self.app.config['PROFILE_SLOW_MS'] and not g.get('profile_requested'):
+            return response
+
+        started = datetime.utcnow()
+        name = f"{started.strftime('%Y%m%dT%H%M%S')}-{request.endpoint or 'unknown'}-{os.getpid()}-{next(self._dump_ids)}.folded"
+        os.makedirs(self.app.config['PROFILE_DIRECTORY'], exist_ok=True)
+        with open(os.path.join(self.app.config['PROFILE_DIRECTORY'], name), 'w') as f:
+            for stack, count in profile.stacks.items():
+                f.write(f'{stack} {count}\n')
+
+        self.slow_requests.append({
+            'profile': name,
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'started_at': started.isoformat(),
+            'duration_ms': round(duration * 1000, 1),
+            'sql_ms': round(profile.sql_time * 1000, 1),
+            'sql_queries': profile.sql_queries,
+            'esi_ms': round(profile.esi_time * 1000, 1),
+            'esi_calls': profile.esi_calls,
+            'samples': sum(profile.stacks.values()),
+        })
+        return response
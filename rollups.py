@@ -0,0 +1,59 @@
+"""
+Hourly and daily rollups of delivered industry jobs.
+
+Charts of production throughput would otherwise scan the whole job history
+on every view. Instead, every job is counted once, when it is delivered, in
+one row per period, corporation, installer, activity and product, so a chart
+reads at most a few hundred rows. `rollup_deltas` computes the counts to add
+for a batch of jobs, both during sync and when backfilling.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+
+GRANULARITIES = {'hour': timedelta(hours=1), 'day': timedelta(days=1)}
+
+# Columns a rollup row is keyed by besides its period, which series can be grouped by
+DIMENSIONS = ('installer_id', 'activity_id', 'product_type_id')
+
+# Summed columns of a rollup row
+MEASURES = ('jobs', 'runs', 'successful_runs')
+
+# Columns of the keys returned by `rollup_deltas`
+KEY_COLUMNS = ('corporation_id', 'granularity', 'period_start') + DIMENSIONS
+
+
+def period_start(moment, granularity):
+    """Start of the hour or day containing `moment`"""
+    moment = moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0) if granularity == 'day' else moment
+
+
+def rollup_deltas(jobs):
+    """
+    Counts to add to the rollups for delivered jobs.
+
+    :param jobs: Objects or rows with `corporation_id`, `installer_character_id`, `activity_id`,
+        `product_type_id`, `runs`, `successful_runs`, `completed_date` and `end_date` attributes; jobs
+        without an installer character are counted under installer 0
+    :returns dict: `(corporation_id, granularity, period_start, installer_id, activity_id, product_type_id)`
+        keys mapped to `[jobs, runs, successful_runs]`
+    """
+    deltas = defaultdict(lambda: [0, 0, 0])
+    for job in jobs:
+        completed = job.completed_date or job.end_date
+        successful_runs = job.runs if job.successful_runs is None else job.successful_runs
+        for granularity in GRANULARITIES:
+            counts = deltas[(
+                job.corporation_id, granularity, period_start(completed, granularity),
+                job.installer_character_id or 0, job.activity_id, job.product_type_id or 0,
+            )]
+            counts[0] += 1
+            counts[1] += job.runs
+            counts[2] += successful_runs
+    return dict(deltas)
+
+
+def rollup_rows(deltas):
+    """Rollup rows to insert for deltas returned by `rollup_deltas`, as dicts of column values"""
+    return [{**dict(zip(KEY_COLUMNS, key)), **dict(zip(MEASURES, counts))} for key, counts in deltas.items()]
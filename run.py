@@ -7,14 +7,16 @@ It handles environment setup, database initialization, and provides helpful
 startup information.
 
 Usage:
-    python run.py [--dev] [--port PORT] [--host HOST]
+    python run.py [--dev] [--port PORT] [--host HOST] [--profile [--profile-route ROUTE]...]
 
 Options:
-    --dev       Run in development mode with debug enabled
-    --port      Port to run the application on (default: 5000)
-    --host      Host to bind to (default: 127.0.0.1)
-    --init-db   Initialize the database tables
-    --help      Show this help message
+    --dev            Run in development mode with debug enabled
+    --port           Port to run the application on (default: 5000)
+    --host           Host to bind to (default: 127.0.0.1)
+    --init-db        Initialize the database tables
+    --profile        Profile requests, keeping dumps of slow ones under instance/profiles/
+    --profile-route  Only profile this endpoint or path prefix; can be repeated
+    --help           Show this help message
 """
 
 import argparse
@@ -45,7 +47,7 @@ def check_dependencies():
     """Check if required dependencies are installed."""
     required_packages = [
         'flask', 'flask_sqlalchemy', 'flask_migrate', 
-        'requests', 'jwt'
+        'requests', 'jwt', 'numpy'
     ]
     
     missing_packages = []
@@ -104,6 +106,11 @@ def print_startup_info(host, port, debug=False):
     print(f"🔧 Debug Mode: {'Enabled' if debug else 'Disabled'}")
     print(f"📝 Environment: {'Development' if debug else 'Production'}")
     
+    from app import app
+    if app.config['PROFILE']:
+        routes = ', '.join(app.config['PROFILE_ROUTES']) or 'all routes'
+        print(f"🔬 Profiling: {routes} (requests over {app.config['PROFILE_SLOW_MS']} ms are kept)")
+    
     # Check configuration status
     config_ok = check_configuration()
     if not config_ok:
@@ -148,6 +155,20 @@ def main():
         help='Host to bind to (default: 127.0.0.1)'
     )
     
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Profile requests and keep dumps of slow ones'
+    )
+    
+    parser.add_argument(
+        '--profile-route',
+        action='append',
+        default=[],
+        metavar='ROUTE',
+        help='Only profile this endpoint or path prefix (e.g. dashboard or /api/); can be repeated'
+    )
+    
     parser.add_argument(
         '--init-db',
         action='store_true',
@@ -184,6 +205,11 @@ def main():
     debug_mode = args.dev or os.getenv('FLASK_ENV') == 'development'
     app.config['DEBUG'] = debug_mode
     
+    # Enable request profiling
+    if args.profile:
+        app.config['PROFILE'] = True
+        app.config['PROFILE_ROUTES'] = args.profile_route
+    
     # Initialize database if it doesn't exist
     db_path = current_dir / 'eve_industry.db'
     if not db_path.exists():
@@ -191,6 +217,11 @@ def main():
         if not initialize_database():
             sys.exit(1)
     
+    # Start the job completion scheduler, only in the reloader's child process when debugging
+    if app.config['SYNC_SCHEDULER'] and (not debug_mode or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'):
+        from app import start_sync_scheduler
+        start_sync_scheduler()
+    
     # Print startup information
     print_startup_info(args.host, args.port, debug_mode)
     
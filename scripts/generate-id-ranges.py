@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+
+import re
+from os.path import join, dirname, abspath
+
+#
+# Configuration
+#
+# The guide the ranges are read from. Only the first table is used, as the tables
+# in the later sections subdivide ranges from the first one.
+SOURCE = abspath(join(dirname(abspath(__file__)), "..", "docs", "guides", "id-ranges.md"))
+
+# The module that is generated, used by the industry tracker.
+TARGET = abspath(join(dirname(abspath(__file__)), "..", "id_ranges.py"))
+
+# The mapping of range descriptions to the short names used in code. Descriptions
+# not listed here get a name derived from the description.
+KIND_MAPPING = {
+    "Various": "various",
+    "Factions": "faction",
+    "NPC corporations": "npc_corporation",
+    "NPC characters (agents and NPC corporation CEOs)": "npc_character",
+    "Universes": "universe",
+    "Regions": "region",
+    "Constellations": "constellation",
+    "Solar systems": "solar_system",
+    "Celestials (suns, planets, moons, asteroid belts)": "celestial",
+    "Stargates": "stargate",
+    "Stations": "station",
+    "Asteroids": "asteroid",
+    "Control Bunkers": "control_bunker",
+    "WiS Promenades": "promenade",
+    "Planetary Districts": "planetary_district",
+    "EVE characters created between 2010-11-03 and 2016-05-30": "character",
+    "EVE corporations created after 2010-11-03": "corporation",
+    "EVE alliances created after 2010-11-03": "alliance",
+    "EVE characters, corporations and alliances created before 2010-11-03": "legacy_entity",
+    "EVE / DUST characters created after 2016-05-30": "character",
+    "EVE characters created after 2016-05-30": "character",
+    "Spawned items": "item",
+}
+
+#
+# End of configuration
+#
+
+TEMPLATE = '''\
+# This file is generated from docs/guides/id-ranges.md by scripts/generate-id-ranges.py.
+# Do not edit it by hand; update the guide instead.
+"""
+Classifies EVE IDs by the numeric range they fall in.
+
+Ranges are looked up with a binary search over the sorted range starts, either
+for a single ID with `classify`, or for a NumPy array of IDs with `classify_array`.
+"""
+
+from bisect import bisect_right
+
+STARTS = {starts!r}
+ENDS = {ends!r}
+KINDS = {kinds!r}
+DESCRIPTIONS = {descriptions!r}
+
+
+def classify(entity_id):
+    """Return the kind of `entity_id`, or None if it is not in any documented range."""
+    i = bisect_right(STARTS, entity_id) - 1
+    if i < 0 or (ENDS[i] is not None and entity_id > ENDS[i]):
+        return None
+    return KINDS[i]
+
+
+def classify_array(entity_ids):
+    """Return an object array with the kind of every ID in `entity_ids` (None if unknown)."""
+    import numpy as np
+
+    entity_ids = np.asarray(entity_ids, dtype=np.int64)
+    ends = np.array([np.iinfo(np.int64).max if end is None else end for end in ENDS], dtype=np.int64)
+    i = np.searchsorted(np.array(STARTS, dtype=np.int64), entity_ids, side='right') - 1
+    known = (i >= 0) & (entity_ids <= ends[np.maximum(i, 0)])
+    kinds = np.array(KINDS + (None,), dtype=object)
+    return kinds[np.where(known, i, len(KINDS))]
+'''
+
+
+def parse_number(value):
+    value = value.strip().replace(",", "")
+    return int(value) if value.isdigit() else None
+
+
+def parse_ranges(markdown):
+    ranges = []
+    in_table = False
+    for line in markdown.splitlines():
+        if not line.startswith("|"):
+            if in_table:
+                break
+            continue
+        in_table = True
+        start, end, description = [cell.strip() for cell in line.strip("|").split("|")]
+        if parse_number(start) is None:
+            continue  # Header or separator row
+        # Strip links to the later sections, keeping only their text.
+        description = re.sub(r"\[([^\]]*)\]\([^)]*\)", r"\1", description)
+        description = re.sub(r"\s*\(often reused between different types\)", "", description)
+        ranges.append((parse_number(start), parse_number(end), description))
+    return sorted(ranges)
+
+
+def kind_for(description):
+    if description in KIND_MAPPING:
+        return KIND_MAPPING[description]
+    return re.sub(r"[^a-z0-9]+", "_", description.lower()).strip("_")
+
+
+def write_if_changed(fname, content):
+    try:
+        with open(fname, "r") as f:
+            old_content = f.read()
+    except FileNotFoundError:
+        old_content = None
+
+    if old_content != content:
+        with open(fname, "w") as f:
+            f.write(content)
+
+
+def generate():
+    with open(SOURCE, "r") as f:
+        ranges = parse_ranges(f.read())
+
+    write_if_changed(
+        TARGET,
+        TEMPLATE.format(
+            starts=tuple(start for start, _, _ in ranges),
+            ends=tuple(end for _, end, _ in ranges),
+            kinds=tuple(kind_for(description) for _, _, description in ranges),
+            descriptions=tuple(description for _, _, description in ranges),
+        ),
+    )
+
+
+def on_pre_build(**kwargs):
+    generate()
+
+
+if __name__ == "__main__":
+    generate()
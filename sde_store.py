@@ -0,0 +1,260 @@
+"""
+Local type and blueprint store built from the Static Data Export (SDE).
+
+`build_store` converts the SDE's `types.yaml` and `blueprints.yaml` into a
+single compact binary file, which `SDEStore` memory-maps. Lookups read
+straight from the mapping, so every worker process shares the same pages
+and nothing is parsed at startup.
+
+File layout (little-endian):
+
+    header     MAGIC, then the section offsets and counts below
+    index      uint32 per type ID up to the highest type ID; row number + 1, 0 if unknown
+    types      TYPE_ROW per type
+    materials  MATERIAL_ROW per blueprint activity material, grouped by blueprint
+    products   PRODUCT_ROW per blueprint activity product, grouped by blueprint
+    names      UTF-8 type names, referenced by offset and length from the type rows
+    name index uint32 type row numbers, sorted by lowercase name
+"""
+
+import mmap
+from bisect import bisect_left
+import os
+import struct
+import zipfile
+
+MAGIC = b'EVESDE01'
+HEADER = struct.Struct('<8s12I')
+# type_id, name offset, name length, first material, material count,
+# first product, product count, blueprint that makes this type (0 if none)
+TYPE_ROW = struct.Struct('<8I')
+MATERIAL_ROW = struct.Struct('<3I')  # activity_id, type_id, quantity
+PRODUCT_ROW = struct.Struct('<3If')  # activity_id, type_id, quantity, probability
+INDEX_ENTRY = struct.Struct('<I')
+
+# SDE activity names and their industry activity IDs
+ACTIVITY_IDS = {
+    'manufacturing': 1,
+    'research_time': 3,
+    'research_material': 4,
+    'copying': 5,
+    'invention': 8,
+    'reaction': 11,
+}
+
+# Activities whose products are what a blueprint "makes"
+PRODUCTION_ACTIVITIES = (ACTIVITY_IDS['manufacturing'], ACTIVITY_IDS['reaction'])
+
+
+def _load_yaml(stream):
+    try:
+        import yaml
+    except ImportError:
+        raise RuntimeError('PyYAML is required to import the SDE: pip install pyyaml')
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    return yaml.load(stream, Loader=loader)
+
+
+def _read_sde_file(sde_path, name):
+    """Load `fsd/<name>` from an extracted SDE directory or the SDE zip file"""
+    if os.path.isdir(sde_path):
+        for root, _, files in os.walk(sde_path):
+            if name in files and os.path.basename(root) == 'fsd':
+                with open(os.path.join(root, name), 'rb') as stream:
+                    return _load_yaml(stream)
+    else:
+        with zipfile.ZipFile(sde_path) as archive:
+            for member in archive.namelist():
+                if member.endswith(f'fsd/{name}'):
+                    with archive.open(member) as stream:
+                        return _load_yaml(stream)
+    raise FileNotFoundError(f'fsd/{name} not found in {sde_path}')
+
+
+def build_store(types, blueprints, output_path):
+    """
+    Write a store file from SDE data.
+
+    :param dict types: Contents of `types.yaml`, keyed by type ID
+    :param dict blueprints: Contents of `blueprints.yaml`, keyed by blueprint type ID
+    """
+    type_ids = sorted(set(types) | set(blueprints))
+    rows = {type_id: i for i, type_id in enumerate(type_ids)}
+
+    names = bytearray()
+    name_refs = []
+    for type_id in type_ids:
+        name = ((types.get(type_id) or {}).get('name') or {}).get('en', '').encode('utf-8')
+        name_refs.append((len(names), len(name)))
+        names += name
+
+    materials = []
+    products = []
+    blueprint_refs = {}
+    made_by = {}
+    for blueprint_id in sorted(blueprints):
+        material_start, product_start = len(materials), len(products)
+        for activity, details in (blueprints[blueprint_id].get('activities') or {}).items():
+            activity_id = ACTIVITY_IDS.get(activity)
+            if activity_id is None:
+                continue
+            for material in details.get('materials', []):
+                materials.append((activity_id, material['typeID'], material['quantity']))
+            for product in details.get('products', []):
+                products.append((activity_id, product['typeID'], product['quantity'], product.get('probability', 1.0)))
+                if activity_id in PRODUCTION_ACTIVITIES:
+                    made_by.setdefault(product['typeID'], blueprint_id)
+        blueprint_refs[blueprint_id] = (
+            material_start, len(materials) - material_start,
+            product_start, len(products) - product_start,
+        )
+
+    # Products may reference types missing from types.yaml; give them a row too
+    for type_id in sorted(set(made_by) - set(rows)):
+        rows[type_id] = len(type_ids)
+        type_ids.append(type_id)
+        name_refs.append((len(names), 0))
+
+    index_count = max(type_ids, default=-1) + 1
+    index_offset = HEADER.size
+    types_offset = index_offset + index_count * INDEX_ENTRY.size
+    materials_offset = types_offset + len(type_ids) * TYPE_ROW.size
+    products_offset = materials_offset + len(materials) * MATERIAL_ROW.size
+    names_offset = products_offset + len(products) * PRODUCT_ROW.size
+
+    name_index_offset = names_offset + len(names)
+    name_order = sorted(
+        (row for row, (_, length) in enumerate(name_refs) if length),
+        key=lambda row: names[name_refs[row][0]:sum(name_refs[row])].decode('utf-8').lower(),
+    )
+
+    index = bytearray(index_count * INDEX_ENTRY.size)
+    for type_id, row in rows.items():
+        INDEX_ENTRY.pack_into(index, type_id * INDEX_ENTRY.size, row + 1)
+
+    temporary_path = f'{output_path}.tmp'
+    with open(temporary_path, 'wb') as output:
+        output.write(HEADER.pack(
+            MAGIC,
+            index_offset, index_count,
+            types_offset, len(type_ids),
+            materials_offset, len(materials),
+            products_offset, len(products),
+            names_offset, len(names),
+            name_index_offset, len(name_order),
+        ))
+        output.write(index)
+        for type_id, (name_offset, name_length) in zip(type_ids, name_refs):
+            refs = blueprint_refs.get(type_id, (0, 0, 0, 0))
+            output.write(TYPE_ROW.pack(type_id, name_offset, name_length, *refs, made_by.get(type_id, 0)))
+        for material in materials:
+            output.write(MATERIAL_ROW.pack(*material))
+        for product in products:
+            output.write(PRODUCT_ROW.pack(*product))
+        output.write(names)
+        for row in name_order:
+            output.write(INDEX_ENTRY.pack(row))
+    # Replace atomically, so running processes keep their mapping of the old file
+    os.replace(temporary_path, output_path)
+    return len(type_ids), len(blueprints)
+
+
+def import_sde(sde_path, output_path):
+    """Build a store file from an SDE zip file or extracted directory"""
+    types = _read_sde_file(sde_path, 'types.yaml')
+    blueprints = _read_sde_file(sde_path, 'blueprints.yaml')
+    return build_store(types, blueprints, output_path)
+
+
+class SDEStore:
+    """Read-only, memory-mapped view of a store file"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header = HEADER.unpack_from(self._map, 0)
+        if header[0] != MAGIC:
+            raise ValueError(f'{path} is not an SDE store file')
+        (self._index_offset, self._index_count,
+         self._types_offset, self.type_count,
+         self._materials_offset, _,
+         self._products_offset, _,
+         self._names_offset, _,
+         self._name_index_offset, self._name_index_count) = header[1:]
+        self._sorted_names = _SortedNames(self)
+
+    def close(self):
+        self._map.close()
+
+    def _type_row(self, row):
+        return TYPE_ROW.unpack_from(self._map, self._types_offset + row * TYPE_ROW.size)
+
+    def _row(self, type_id):
+        if not 0 <= type_id < self._index_count:
+            return None
+        row = INDEX_ENTRY.unpack_from(self._map, self._index_offset + type_id * INDEX_ENTRY.size)[0]
+        if not row:
+            return None
+        return self._type_row(row - 1)
+
+    def _name(self, row):
+        start = self._names_offset + row[1]
+        return self._map[start:start + row[2]].decode('utf-8')
+
+    def __contains__(self, type_id):
+        return self._row(type_id) is not None
+
+    def type_name(self, type_id):
+        """English name of a type, or None if unknown"""
+        row = self._row(type_id)
+        if row is None or not row[2]:
+            return None
+        return self._name(row)
+
+    def type_id(self, name):
+        """Type ID of a type name, ignoring case, or None if unknown"""
+        position = bisect_left(self._sorted_names, name.lower())
+        if position == len(self._sorted_names):
+            return None
+        row = self._sorted_names.row(position)
+        return row[0] if self._name(row).lower() == name.lower() else None
+
+    def materials(self, blueprint_type_id, activity_id=ACTIVITY_IDS['manufacturing']):
+        """List of (material type ID, quantity) for one run of a blueprint activity"""
+        row = self._row(blueprint_type_id)
+        if row is None:
+            return []
+        start = self._materials_offset + row[3] * MATERIAL_ROW.size
+        entries = (MATERIAL_ROW.unpack_from(self._map, start + i * MATERIAL_ROW.size) for i in range(row[4]))
+        return [(type_id, quantity) for activity, type_id, quantity in entries if activity == activity_id]
+
+    def products(self, blueprint_type_id, activity_id=ACTIVITY_IDS['manufacturing']):
+        """List of (product type ID, quantity per run, probability) of a blueprint activity"""
+        row = self._row(blueprint_type_id)
+        if row is None:
+            return []
+        start = self._products_offset + row[5] * PRODUCT_ROW.size
+        entries = (PRODUCT_ROW.unpack_from(self._map, start + i * PRODUCT_ROW.size) for i in range(row[6]))
+        return [(type_id, quantity, probability) for activity, type_id, quantity, probability in entries if activity == activity_id]
+
+    def blueprint_for(self, product_type_id):
+        """Type ID of the blueprint or reaction formula that makes a type, or None"""
+        row = self._row(product_type_id)
+        return row[7] or None if row else None
+
+
+class _SortedNames:
+    # Sequence of lowercase type names in name index order, for bisect
+    def __init__(self, store):
+        self._store = store
+
+    def __len__(self):
+        return self._store._name_index_count
+
+    def row(self, position):
+        store = self._store
+        row = INDEX_ENTRY.unpack_from(store._map, store._name_index_offset + position * INDEX_ENTRY.size)[0]
+        return store._type_row(row)
+
+    def __getitem__(self, position):
+        return self._store._name(self.row(position)).lower()
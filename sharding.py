@@ -0,0 +1,109 @@
+"""
+Optional per-corporation sharding of job data.
+
+When enabled, the tables in `ShardRouter.tables` are stored in one SQLite
+database per corporation, while users stay in the main database. The
+corporation a query is routed to is taken from `current_corporation`, which is
+set per request or with the `corporation_shard` context manager.
+"""
+
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import sqlalchemy as sa
+from flask_sqlalchemy.session import Session
+
+current_corporation = ContextVar('current_corporation', default=None)
+
+SHARD_FILENAME = 'corporation_{corporation_id}.db'
+SHARD_FILENAME_PATTERN = re.compile(r'^corporation_(\d+)\.db$')
+
+
+@contextmanager
+def corporation_shard(corporation_id):
+    """Route queries on sharded tables to `corporation_id`'s database inside the block"""
+    token = current_corporation.set(corporation_id)
+    try:
+        yield
+    finally:
+        current_corporation.reset(token)
+
+
+class ShardRouter:
+    def __init__(self):
+        self.enabled = False
+        self.directory = None
+        self.metadata = None
+        self.tables = set()
+        self._engines = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app, metadata, tables):
+        self.enabled = app.config.get('SHARD_BY_CORPORATION', False)
+        self.directory = app.config.get('SHARD_DIRECTORY') or os.path.join(app.instance_path, 'shards')
+        self.metadata = metadata
+        self.tables = set(tables)
+
+    def engine(self, corporation_id):
+        """Get the engine of a corporation's database, creating the database if needed"""
+        with self._lock:
+            engine = self._engines.get(corporation_id)
+            if engine is None:
+                os.makedirs(self.directory, exist_ok=True)
+                path = os.path.join(self.directory, SHARD_FILENAME.format(corporation_id=corporation_id))
+                engine = self._engines[corporation_id] = sa.create_engine(f'sqlite:///{path}')
+                self.metadata.create_all(engine, tables=[self.metadata.tables[name] for name in self.tables])
+            return engine
+
+    def corporation_ids(self):
+        """IDs of all corporations that have a database"""
+        if not self.directory or not os.path.isdir(self.directory):
+            return []
+        matches = (SHARD_FILENAME_PATTERN.match(name) for name in os.listdir(self.directory))
+        return sorted(int(match.group(1)) for match in matches if match)
+
+    def bind_for(self, mapper):
+        """The shard engine for a mapper, or None if the query goes to the main database"""
+        corporation_id = current_corporation.get()
+        if not self.enabled or corporation_id is None:
+            return None
+        if sa.inspect(mapper).local_table.name not in self.tables:
+            return None
+        return self.engine(corporation_id)
+
+    def fan_out(self, app, fn, corporation_ids=None):
+        """
+        Call `fn()` once per corporation in parallel, each in its own app context and
+        routed to that corporation's database. Returns a `{corporation_id: result}` dict.
+
+        Without sharding, `fn()` is called once against the main database, keyed by None.
+        """
+        if not self.enabled:
+            with app.app_context():
+                return {None: fn()}
+
+        def run(corporation_id):
+            with app.app_context(), corporation_shard(corporation_id):
+                return fn()
+
+        corporation_ids = self.corporation_ids() if corporation_ids is None else list(corporation_ids)
+        with ThreadPoolExecutor(max_workers=min(8, len(corporation_ids)) or 1) as executor:
+            return dict(zip(corporation_ids, executor.map(run, corporation_ids)))
+
+
+router = ShardRouter()
+
+
+class ShardedSession(Session):
+    """Session that sends queries on sharded tables to the current corporation's database"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and mapper is not None:
+            engine = router.bind_for(mapper)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
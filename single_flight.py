@@ -0,0 +1,73 @@
+"""
+Coalescing of concurrent calls that would do the same work.
+
+Only one call runs per key at a time. Callers that arrive while it runs wait
+for it and share its result, and a successful result is reused for
+`min_interval` seconds after it finished. How often each of these happened
+is counted in `metrics`.
+"""
+
+import threading
+import time
+from collections import Counter
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, min_interval=0):
+        self.min_interval = min_interval
+        self.metrics = Counter()  # ran, joined (waited for a running call), recent (reused a finished one)
+        self._lock = threading.Lock()
+        self._calls = {}  # key -> running _Call
+        self._recent = {}  # key -> (monotonic time finished, result) of the last successful call
+
+    def do(self, key, fn, min_interval=None):
+        """
+        Call `fn()` unless a call for `key` is running or finished recently.
+
+        :param key: Identifies calls that do the same work
+        :param fn: Function without arguments; a falsy result counts as a failure and is not reused
+        :param min_interval: Overrides `self.min_interval` for this call
+        :returns tuple: The result and how it was obtained: 'ran', 'joined' or 'recent'
+        """
+        min_interval = self.min_interval if min_interval is None else min_interval
+        with self._lock:
+            recent = self._recent.get(key)
+            if recent and time.monotonic() - recent[0] < min_interval:
+                self.metrics['recent'] += 1
+                return recent[1], 'recent'
+            call = self._calls.get(key)
+            owner = call is None
+            if owner:
+                call = self._calls[key] = _Call()
+            self.metrics['ran' if owner else 'joined'] += 1
+
+        if not owner:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, 'joined'
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                if call.error is None and call.result:
+                    self._recent[key] = (time.monotonic(), call.result)
+            call.done.set()
+        return call.result, 'ran'
+
+    def stats(self):
+        """Copy of the metrics, plus the number of calls running now"""
+        with self._lock:
+            return dict(self.metrics, running=len(self._calls))
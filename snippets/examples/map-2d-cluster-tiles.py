@@ -0,0 +1,144 @@
+# Using 'Pillow' for image encoding and 'NumPy' for the projection & rasterization.
+
+
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+# Tile config
+TILE_SIZE = 256
+MAX_ZOOM = 6  # Zoom level `z` is `2**z` by `2**z` tiles
+STAR_RADIUS = 1
+OUTPUT_DIR = "tiles"
+CACHE_DIR = ".map-cache"
+
+system_coordinates = np.array([
+    # Let `system_coordinates` be a list of `(x, y, z)` tuples, loaded from either the SDE or ESI
+], dtype=np.float64).reshape(-1, 3)
+
+# Pixel offsets covered by a single star, drawn for every star at once.
+_r = np.arange(-STAR_RADIUS, STAR_RADIUS + 1)
+_dx, _dy = np.meshgrid(_r, _r)
+_disc = _dx**2 + _dy**2 <= STAR_RADIUS**2
+STAR_DX, STAR_DY = _dx[_disc], _dy[_disc]
+
+
+def project(coordinates):
+    """
+    Projects all coordinates onto the unit square in a single pass, using the same
+    bounding-box approach as the single image example.
+
+    :param ndarray coordinates: Array of shape (systems, 3)
+    :returns ndarray: Array of shape (systems, 2) with image positions in range [0, 1]
+    """
+    if len(coordinates) == 0:
+        return np.zeros((0, 2))
+
+    x, z = coordinates[:, 0], coordinates[:, 2]
+    x_min, z_max = min(x.min(), 0), max(z.max(), 0)
+    map_size = max(max(x.max(), 0) - x_min, z_max - min(z.min(), 0)) or 1  # A lone star at the origin
+    return np.stack(((x - x_min) / map_size, -(z - z_max) / map_size), axis=-1)
+
+
+def cached_projection(coordinates):
+    """
+    Returns the projection of `coordinates`, reusing the result of a previous run if the input is unchanged.
+    """
+    key = hashlib.sha256(np.ascontiguousarray(coordinates).tobytes()).hexdigest()[:16]
+    path = os.path.join(CACHE_DIR, f"projection-{key}.npy")
+    if os.path.exists(path):
+        return np.load(path)
+
+    projected = project(coordinates)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    np.save(path, projected)
+    return projected
+
+
+def render_tile(zoom, tx, ty, pixels):
+    """
+    Rasterizes all stars of a single tile and writes it to `OUTPUT_DIR/zoom/tx/ty.png`.
+
+    :param ndarray pixels: Integer pixel positions of the stars, relative to the top-left corner of the tile
+    """
+    # Stars are white on opaque black, so a grayscale image looks the same and encodes several times faster.
+    img = np.zeros((TILE_SIZE, TILE_SIZE), dtype=np.uint8)
+
+    px = (pixels[:, 0, None] + STAR_DX).ravel()
+    py = (pixels[:, 1, None] + STAR_DY).ravel()
+    inside = (px >= 0) & (px < TILE_SIZE) & (py >= 0) & (py < TILE_SIZE)
+    img[py[inside], px[inside]] = 255
+
+    path = os.path.join(OUTPUT_DIR, str(zoom), str(tx))
+    os.makedirs(path, exist_ok=True)
+    Image.fromarray(img, "L").save(os.path.join(path, f"{ty}.png"))
+
+
+def tiles_for_zoom(projected, zoom):
+    """
+    Splits the stars into the tiles they touch at `zoom`. Tiles without any stars are skipped.
+
+    :returns Generator[tuple]: `(zoom, tx, ty, pixels)` tuples, one per non-empty tile
+    """
+    if len(projected) == 0:
+        return
+
+    tiles = 2**zoom
+    world = np.floor(projected * (TILE_SIZE * tiles - 1)).astype(np.int64)
+
+    # A star near an edge also touches the neighbouring tile, so it's assigned to every tile its disc overlaps.
+    offsets = np.array([(dx, dy) for dx in (-STAR_RADIUS, 0, STAR_RADIUS) for dy in (-STAR_RADIUS, 0, STAR_RADIUS)])
+    tile_xy = np.clip((world[:, None, :] + offsets) // TILE_SIZE, 0, tiles - 1)
+    star = np.repeat(np.arange(len(world)), len(offsets))
+    tile_id = tile_xy[..., 0].ravel() * tiles + tile_xy[..., 1].ravel()
+
+    # Sorting on a combined key groups the stars by tile and drops duplicates in one step.
+    keys = np.unique(tile_id * len(world) + star)
+    tile_id, star = np.divmod(keys, len(world))
+    bounds = np.flatnonzero(np.diff(tile_id)) + 1
+    for first, stars in zip(np.concatenate(([0], bounds)), np.split(star, bounds)):
+        tx, ty = divmod(int(tile_id[first]), tiles)
+        yield zoom, tx, ty, world[stars] - (tx * TILE_SIZE, ty * TILE_SIZE)
+
+
+# Projected stars of the current pyramid, sent to every worker process once when it starts
+_projected = None
+
+
+def _init_worker(projected):
+    global _projected
+    _projected = projected
+
+
+def render_columns(zoom, first_column, last_column):
+    """
+    Renders the tiles of one zoom level whose column is in `[first_column, last_column)`, in a worker process.
+    """
+    for zoom, tx, ty, pixels in tiles_for_zoom(_projected, zoom):
+        if first_column <= tx < last_column:
+            render_tile(zoom, tx, ty, pixels)
+
+
+def render_pyramid(coordinates, max_zoom=MAX_ZOOM, workers=None):
+    projected = cached_projection(coordinates)
+    workers = workers or os.cpu_count() or 1
+
+    # A few chunks of tile columns per worker and zoom level, as a task per tile costs more to send than to render.
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(projected,)) as executor:
+        futures = []
+        for zoom in range(max_zoom + 1):
+            columns = 2**zoom
+            step = -(-columns // (workers * 4))
+            futures += [
+                executor.submit(render_columns, zoom, first, min(first + step, columns))
+                for first in range(0, columns, step)
+            ]
+        for future in futures:
+            future.result()
+
+
+if __name__ == "__main__":
+    render_pyramid(system_coordinates)
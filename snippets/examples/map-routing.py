@@ -0,0 +1,263 @@
+# Using 'NumPy' for the graph arrays.
+
+
+from collections import OrderedDict
+
+import numpy as np
+
+
+# Jump count in `StargateGraph.distances` of systems that can't reach each other
+UNREACHABLE = np.iinfo(np.uint8).max
+
+
+def _expand(begin, count):
+    # Concatenates the ranges `begin[i]:begin[i] + count[i]` without a Python loop.
+    return np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count) + np.repeat(begin, count)
+
+
+class StargateGraph:
+    """
+    Stargate connections stored as a compressed adjacency array: the neighbours of system `i` are
+    `neighbours[offsets[i]:offsets[i + 1]]`, with systems numbered by their position in `system_ids`.
+
+    Routes are the shortest in number of jumps. A breadth-first search from an origin finds the route to
+    every other system at once, so the resulting tree of predecessors is cached per origin and any later
+    route from that origin is read straight from it. With `precompute_distances`, the jumps between every
+    pair of systems are stored in a table instead, and any route is read from it by walking downhill from
+    the origin, without a search.
+    """
+
+    def __init__(self, system_ids, offsets, neighbours, distances=None, cache_size=1024):
+        self.system_ids = system_ids
+        self.offsets = offsets
+        self.neighbours = neighbours
+        self.distances = distances  # Jumps from system `i` to system `j` at `[i, j]`, if precomputed
+        self.index = {system_id: i for i, system_id in enumerate(system_ids.tolist())}
+        self.cache_size = cache_size
+        self._trees = OrderedDict()
+
+    @classmethod
+    def build(cls, connections, **kwargs):
+        """
+        :param list[tuple[int, int]] connections: `(system_id, destination_system_id)` pairs, one for each
+            stargate, loaded from either the SDE or ESI
+        """
+        connections = np.asarray(connections, dtype=np.int64).reshape(-1, 2)
+        # Gates come in pairs, but add the reverse of every connection in case only one side was loaded.
+        connections = np.unique(np.concatenate((connections, connections[:, ::-1])), axis=0)
+
+        system_ids, edges = np.unique(connections, return_inverse=True)
+        edges = edges.reshape(-1, 2)
+        offsets = np.searchsorted(edges[:, 0], np.arange(len(system_ids) + 1)).astype(np.int32)
+        return cls(system_ids, offsets, edges[:, 1].astype(np.int32), **kwargs)
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        with np.load(path) as data:
+            distances = data["distances"] if "distances" in data else None
+            return cls(data["system_ids"], data["offsets"], data["neighbours"], distances, **kwargs)
+
+    def save(self, path):
+        tables = {} if self.distances is None else {"distances": self.distances}
+        np.savez(path, system_ids=self.system_ids, offsets=self.offsets, neighbours=self.neighbours, **tables)
+
+    def _search(self, origin, avoid=None):
+        # Breadth-first search, expanding a whole frontier per step. Returns the predecessor of every system.
+        predecessor = np.full(len(self.system_ids), -1, dtype=np.int32)
+        visited = np.zeros(len(self.system_ids), dtype=bool) if avoid is None else avoid.copy()
+        visited[origin] = True
+        predecessor[origin] = origin
+
+        frontier = np.array([origin], dtype=np.int32)
+        while frontier.size:
+            begin = self.offsets[frontier]
+            count = self.offsets[frontier + 1] - begin
+            nodes = self.neighbours[_expand(begin, count)]
+            parents = np.repeat(frontier, count)
+
+            new = ~visited[nodes]
+            nodes, first = np.unique(nodes[new], return_index=True)
+            visited[nodes] = True
+            predecessor[nodes] = parents[new][first]
+            frontier = nodes
+
+        return predecessor
+
+    def _tree(self, origin):
+        tree = self._trees.get(origin)
+        if tree is None:
+            tree = self._trees[origin] = self._search(origin)
+            if len(self._trees) > self.cache_size:
+                self._trees.popitem(last=False)
+        else:
+            self._trees.move_to_end(origin)
+        return tree
+
+    def _avoid_mask(self, avoid):
+        mask = np.zeros(len(self.system_ids), dtype=bool)
+        mask[[self.index[system_id] for system_id in avoid if system_id in self.index]] = True
+        return mask
+
+    def _table_path(self, origin, destination):
+        # Jumps are symmetric, so the row of the destination holds every system's distance to it.
+        remaining = self.distances[destination]
+        if remaining[origin] == UNREACHABLE:
+            return None
+        path = [origin]
+        while path[-1] != destination:
+            neighbours = self.neighbours[self.offsets[path[-1]]:self.offsets[path[-1] + 1]]
+            path.append(int(neighbours[np.argmax(remaining[neighbours] == remaining[path[-1]] - 1)]))
+        return path
+
+    @staticmethod
+    def _path(predecessor, origin, destination):
+        if predecessor[destination] < 0:
+            return None
+        path = [destination]
+        while path[-1] != origin:
+            path.append(int(predecessor[path[-1]]))
+        return path[::-1]
+
+    def precompute(self, origins):
+        """
+        Fills the cache for frequently used origins, such as trade hubs or staging systems.
+        """
+        for origin in origins:
+            self._tree(self.index[origin])
+
+    def precompute_distances(self, block=1024):
+        """
+        Computes the jumps between every pair of systems, one byte per pair, so that every route without
+        avoided systems is answered without a search.
+
+        Breadth-first searches from `block` origins run at once: the origins that have reached a system are
+        the bits of a row of words, and each step ORs the rows of every system's neighbours together. The
+        jumps are counted in bit planes of the same layout, adding one for every origin that hasn't reached
+        a system yet, and only unpacked into bytes once the searches are done.
+        """
+        count = len(self.system_ids)
+        distances = np.empty((count, count), dtype=np.uint8)
+        degree = np.diff(self.offsets)
+        segments = np.minimum(self.offsets[:-1], max(len(self.neighbours) - 1, 0))
+        planes = UNREACHABLE.bit_length()
+
+        def unpack(words, width):
+            return np.unpackbits(words.astype("<u8").view(np.uint8), axis=1, bitorder="little")[:, :width]
+
+        for first in range(0, count, block):
+            origins = np.arange(first, min(first + block, count))
+            slot = np.arange(len(origins))
+            reached = np.zeros((count, -(-len(origins) // 64)), dtype=np.uint64)
+            reached[origins, slot // 64] = np.uint64(1) << (slot % 64).astype(np.uint64)
+            jumps = np.zeros((planes,) + reached.shape, dtype=np.uint64)
+
+            frontier, depth = reached.copy(), 0
+            while frontier.any():
+                depth += 1
+                if depth == UNREACHABLE:
+                    raise ValueError(f"Routes of {UNREACHABLE} jumps or more don't fit the distance table")
+                # Add one jump for every origin that hasn't reached a system yet, with a ripple carry.
+                carry = ~reached
+                for plane in jumps:
+                    plane ^= carry
+                    carry &= ~plane
+                adjacent = np.bitwise_or.reduceat(frontier[self.neighbours], segments, axis=0)
+                adjacent[degree == 0] = 0
+                frontier = adjacent & ~reached
+                reached |= frontier
+
+            block_distances = np.zeros((count, len(origins)), dtype=np.uint8)
+            for bit, plane in enumerate(jumps):
+                block_distances |= unpack(plane, len(origins)) << bit
+            block_distances[unpack(~reached, len(origins)).astype(bool)] = UNREACHABLE
+            distances[origins] = block_distances.T
+
+        self.distances = distances
+
+    def route(self, origin, destination, avoid=()):
+        """
+        :param int origin: Solarsystem ID to start from
+        :param int destination: Solarsystem ID to travel to
+        :param iterable[int] avoid: Solarsystem IDs the route may not pass through
+        :returns list[int]: The solarsystem IDs along the route, including origin and destination, or
+            None if there is no route
+        """
+        return self.routes([(origin, destination)], avoid)[0]
+
+    def routes(self, pairs, avoid=()):
+        """
+        Batch version of `route`, running a single search per distinct origin.
+
+        :param list[tuple[int, int]] pairs: `(origin, destination)` solarsystem ID pairs
+        :returns list[list[int]]: The route of every pair, in the same order
+        """
+        avoid = set(avoid)
+        mask = self._avoid_mask(avoid) if avoid else None
+
+        trees = {}
+        results = []
+        for origin, destination in pairs:
+            if origin not in self.index or destination not in self.index or destination in avoid:
+                results.append(None)
+                continue
+            start = self.index[origin]
+            if mask is None and self.distances is not None:
+                path = self._table_path(start, self.index[destination])
+                results.append(None if path is None else self.system_ids[path].tolist())
+                continue
+            if start not in trees:
+                trees[start] = self._tree(start) if mask is None else self._search(start, mask)
+            path = self._path(trees[start], start, self.index[destination])
+            results.append(None if path is None else self.system_ids[path].tolist())
+        return results
+
+
+if __name__ == "__main__":
+    # Benchmark on a random graph of roughly the size of New Eden, linking each system to its nearest neighbours.
+    import time
+
+    rng = np.random.default_rng(0)
+    points = rng.normal(size=(8000, 2))
+    distance = np.linalg.norm(points[:, None, :] - points[None, :, :], axis=-1)
+    nearest = np.argsort(distance, axis=1)[:, 1:4]
+    connections = [(30000000 + a, 30000000 + b) for a, row in enumerate(nearest) for b in row]
+
+    start = time.perf_counter()
+    graph = StargateGraph.build(connections)
+    print(f"build:                  {time.perf_counter() - start:.4f}s")
+
+    pairs = [tuple(pair) for pair in rng.choice(graph.system_ids, (1000, 2))]
+
+    start = time.perf_counter()
+    for origin, destination in pairs:
+        graph._trees.clear()
+        graph.route(origin, destination)
+    print(f"1000 uncached routes:   {time.perf_counter() - start:.4f}s")
+
+    hubs = graph.system_ids[:10]
+    graph.precompute(hubs)
+    hub_pairs = [(hubs[i % len(hubs)], destination) for i, (_, destination) in enumerate(pairs)]
+    start = time.perf_counter()
+    for origin, destination in hub_pairs:
+        graph.route(origin, destination)
+    print(f"1000 cached routes:     {time.perf_counter() - start:.4f}s")
+
+    start = time.perf_counter()
+    graph.routes(hub_pairs, avoid=graph.system_ids[100:110])
+    print(f"1000 routes, avoiding:  {time.perf_counter() - start:.4f}s")
+
+    start = time.perf_counter()
+    graph.precompute_distances()
+    print(f"distance table:         {time.perf_counter() - start:.4f}s, {graph.distances.nbytes / 2**20:.0f} MiB")
+
+    start = time.perf_counter()
+    table_routes = [graph.route(origin, destination) for origin, destination in pairs]
+    print(f"1000 routes (table):    {time.perf_counter() - start:.4f}s")
+
+    graph.distances = None
+    searched = [graph.route(origin, destination) for origin, destination in pairs]
+    assert [None if route is None else len(route) for route in table_routes] == [
+        None if route is None else len(route) for route in searched
+    ]
+    assert all(route is None or route[0] == origin and route[-1] == destination
+               for route, (origin, destination) in zip(table_routes, pairs))
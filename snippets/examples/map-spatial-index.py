@@ -0,0 +1,163 @@
+# Using 'NumPy' for the index arrays.
+
+
+import numpy as np
+
+LIGHT_YEAR = 9_460_730_472_580_800  # In meters, the unit of the map coordinates
+
+# Cells are addressed by 21 bits per axis, packed into a single 64-bit key.
+_KEY_BITS = 21
+_KEY_OFFSET = 1 << (_KEY_BITS - 1)
+
+
+def _cell_keys(cells):
+    cells = cells + _KEY_OFFSET
+    return (cells[..., 0] << (2 * _KEY_BITS)) | (cells[..., 1] << _KEY_BITS) | cells[..., 2]
+
+
+class SystemGrid:
+    """
+    A uniform grid over solarsystem coordinates.
+
+    Only non-empty cells are stored: the points are sorted by cell, and each cell is a slice of that
+    order. Everything lives in four flat arrays, so the index can be saved and loaded as a single `.npz` file.
+    """
+
+    def __init__(self, points, cell_size, order, keys, starts):
+        self.points = points
+        self.cell_size = float(cell_size)
+        self.order = order  # Point indices, sorted by cell
+        self.keys = keys  # Sorted keys of the non-empty cells
+        self.starts = starts  # Slice of `order` for cell `i` is `starts[i]:starts[i + 1]`
+
+    @classmethod
+    def build(cls, points, cell_size=7 * LIGHT_YEAR):
+        """
+        :param array points: Array of shape (systems, 3), loaded from either the SDE or ESI
+        :param float cell_size: Edge length of a cell, ideally close to the typical query radius
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        keys = _cell_keys(np.floor(points / cell_size).astype(np.int64))
+        order = np.argsort(keys, kind="stable")
+        cell_keys, starts = np.unique(keys[order], return_index=True)
+        return cls(points, cell_size, order, cell_keys, np.append(starts, len(points)))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["points"], data["cell_size"], data["order"], data["keys"], data["starts"])
+
+    def save(self, path):
+        np.savez(path, points=self.points, cell_size=self.cell_size, order=self.order, keys=self.keys, starts=self.starts)
+
+    def _candidates(self, queries, radius):
+        # Every cell that may hold a point within `radius` of each query, as (query, point) pairs.
+        reach = int(np.ceil(radius / self.cell_size))
+        span = np.arange(-reach, reach + 1)
+        offsets = np.stack(np.meshgrid(span, span, span, indexing="ij"), axis=-1).reshape(-1, 3)
+
+        cells = np.floor(queries / self.cell_size).astype(np.int64)
+        keys = _cell_keys(cells[:, None, :] + offsets).ravel()
+
+        slot = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        found = self.keys[slot] == keys
+        begin = np.where(found, self.starts[slot], 0)
+        count = np.where(found, self.starts[slot + 1] - self.starts[slot], 0)
+
+        # Expand each cell slice into its points without a Python loop.
+        total = count.sum()
+        query = np.repeat(np.arange(keys.size) // len(offsets), count)
+        position = np.arange(total) - np.repeat(np.cumsum(count) - count, count) + np.repeat(begin, count)
+        return query, self.order[position]
+
+    def within(self, queries, radius):
+        """
+        Finds all systems within `radius` of every query point.
+
+        :param array queries: Array of shape (queries, 3)
+        :param float radius: Search radius, in meters
+        :returns list[ndarray]: For every query, the indices of the matching systems
+        """
+        queries = np.asarray(queries, dtype=np.float64).reshape(-1, 3)
+        if not len(self.keys):
+            return [np.zeros(0, dtype=np.int64) for _ in queries]
+
+        query, point = self._candidates(queries, radius)
+        distance = np.linalg.norm(self.points[point] - queries[query], axis=-1)
+        keep = distance <= radius
+        query, point = query[keep], point[keep]
+        return np.split(point, np.searchsorted(query, np.arange(1, len(queries))))
+
+    def nearest(self, queries, k=1):
+        """
+        Finds the `k` nearest systems to every query point.
+
+        The search radius starts at one cell and doubles for queries that have fewer than `k` systems
+        in range. Once the neighbourhood would cover more cells than exist, the remaining queries are
+        answered by brute force.
+
+        :param array queries: Array of shape (queries, 3)
+        :param int k: Number of neighbours
+        :returns tuple[ndarray, ndarray]: Indices and distances, both of shape (queries, k), nearest first
+        """
+        queries = np.asarray(queries, dtype=np.float64).reshape(-1, 3)
+        k = min(k, len(self.points))
+        indices = np.empty((len(queries), k), dtype=np.int64)
+        distances = np.empty((len(queries), k), dtype=np.float64)
+
+        pending = np.arange(len(queries))
+        radius = self.cell_size
+        while pending.size:
+            reach = int(np.ceil(radius / self.cell_size))
+            if (2 * reach + 1) ** 3 > len(self.keys):
+                distance = np.linalg.norm(queries[pending, None, :] - self.points[None, :, :], axis=-1)
+                best = np.argsort(distance, axis=1, kind="stable")[:, :k]
+                indices[pending] = best
+                distances[pending] = np.take_along_axis(distance, best, axis=1)
+                break
+
+            unresolved = []
+            for q, found in zip(pending, self.within(queries[pending], radius)):
+                if len(found) < k:
+                    unresolved.append(q)
+                    continue
+                distance = np.linalg.norm(self.points[found] - queries[q], axis=-1)
+                best = np.argsort(distance, kind="stable")[:k]
+                indices[q] = found[best]
+                distances[q] = distance[best]
+            pending = np.array(unresolved, dtype=np.int64)
+            radius *= 2
+
+        return indices, distances
+
+
+if __name__ == "__main__":
+    # Benchmark against a brute-force scan, on random points shaped roughly like New Eden.
+    import time
+
+    rng = np.random.default_rng(0)
+    systems = rng.normal(0, 20 * LIGHT_YEAR, (8000, 3)) * (1.0, 0.2, 1.0)
+    queries = systems[rng.choice(len(systems), 1000, replace=False)]
+    radius = 7 * LIGHT_YEAR
+
+    start = time.perf_counter()
+    grid = SystemGrid.build(systems)
+    print(f"build:                 {time.perf_counter() - start:.4f}s")
+
+    start = time.perf_counter()
+    in_range = grid.within(queries, radius)
+    print(f"within (grid):         {time.perf_counter() - start:.4f}s")
+
+    start = time.perf_counter()
+    brute = [np.flatnonzero(np.linalg.norm(systems - q, axis=-1) <= radius) for q in queries]
+    print(f"within (brute force):  {time.perf_counter() - start:.4f}s")
+    assert all(np.array_equal(np.sort(a), b) for a, b in zip(in_range, brute))
+
+    start = time.perf_counter()
+    _, nearest = grid.nearest(queries, k=5)
+    print(f"nearest (grid):        {time.perf_counter() - start:.4f}s")
+
+    start = time.perf_counter()
+    brute = np.sort(np.linalg.norm(queries[:, None, :] - systems[None, :, :], axis=-1), axis=1)[:, :5]
+    print(f"nearest (brute force): {time.perf_counter() - start:.4f}s")
+    assert np.allclose(nearest, brute)
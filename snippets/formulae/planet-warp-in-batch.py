@@ -0,0 +1,167 @@
+# Using 'NumPy' for the vectorized calculation.
+import numpy as np
+
+# Mersenne Twister (MT19937) parameters, as used by Python's `random` module.
+MT_N = 624
+MT_M = 397
+MT_MATRIX_A = np.uint32(0x9908B0DF)
+MT_UPPER_MASK = np.uint32(0x80000000)
+MT_LOWER_MASK = np.uint32(0x7FFFFFFF)
+
+# The number of IDs seeded at once; each one needs a full 624 word generator state.
+CHUNK_SIZE = 16384
+
+
+def _mtInitialState():
+    # `init_genrand(19650218)`, which is the same for every seed.
+    mt = [19650218]
+    for i in range(1, MT_N):
+        mt.append((1812433253 * (mt[i - 1] ^ (mt[i - 1] >> 30)) + i) & 0xFFFFFFFF)
+    return np.array(mt, dtype=np.uint32)
+
+
+MT_INITIAL_STATE = _mtInitialState()
+
+
+def _mtTemper(y):
+    y = y ^ (y >> np.uint32(11))
+    y = y ^ ((y << np.uint32(7)) & np.uint32(0x9D2C5680))
+    y = y ^ ((y << np.uint32(15)) & np.uint32(0xEFC60000))
+    return y ^ (y >> np.uint32(18))
+
+
+def _mtTwist(mt, kk):
+    y = (mt[kk] & MT_UPPER_MASK) | (mt[kk + 1] & MT_LOWER_MASK)
+    return mt[kk + MT_M] ^ (y >> np.uint32(1)) ^ np.where(y & np.uint32(1), MT_MATRIX_A, np.uint32(0))
+
+
+def firstRandom(ids):
+    """
+    Vectorized `random.Random(id).random()`, seeding one generator per ID.
+
+    This follows CPython's `init_by_array` for seeds that fit in 32 bits, so the results are identical.
+
+    :param array[int] ids: The seeds, in range [0, 2**32)
+    :returns ndarray[float]: The first random number of each generator
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    if ids.size and (ids.min() < 0 or ids.max() >= 2**32):
+        raise ValueError("IDs must be in range [0, 2**32)")
+
+    result = np.empty(ids.shape, dtype=np.float64)
+    flat_ids, flat_result = ids.reshape(-1), result.reshape(-1)
+    for start in range(0, flat_ids.size, CHUNK_SIZE):
+        key = flat_ids[start:start + CHUNK_SIZE].astype(np.uint32)
+        mt = np.repeat(MT_INITIAL_STATE[:, None], key.size, axis=1)
+
+        # `init_by_array` with a single word key; every generator runs in lockstep.
+        i = 1
+        for _ in range(MT_N):
+            prev = mt[i - 1]
+            mt[i] = (mt[i] ^ ((prev ^ (prev >> np.uint32(30))) * np.uint32(1664525))) + key
+            i += 1
+            if i >= MT_N:
+                mt[0] = mt[MT_N - 1]
+                i = 1
+        for _ in range(MT_N - 1):
+            prev = mt[i - 1]
+            mt[i] = (mt[i] ^ ((prev ^ (prev >> np.uint32(30))) * np.uint32(1566083941))) - np.uint32(i)
+            i += 1
+            if i >= MT_N:
+                mt[0] = mt[MT_N - 1]
+                i = 1
+        mt[0] = MT_UPPER_MASK
+
+        # `random()` combines the first two outputs, which only need the first two words of the twist.
+        a = _mtTemper(_mtTwist(mt, 0)) >> np.uint32(5)
+        b = _mtTemper(_mtTwist(mt, 1)) >> np.uint32(6)
+        flat_result[start:start + CHUNK_SIZE] = (a * 67108864.0 + b) * (1.0 / 9007199254740992.0)
+
+    return result
+
+
+def warpinBatch(ids, x, y, z, r):
+    """
+    Vectorized version of `warpin`, computing the warp-in points of many planets at once.
+
+    :param array[int] ids: Planet IDs
+    :param array[float] x: X coordinates of the planets
+    :param array[float] y: Y coordinates of the planets
+    :param array[float] z: Z coordinates of the planets
+    :param array[float] r: Radii of the planets
+    :returns ndarray[float]: The warp-in points, shape (planets, 3)
+    """
+    x, y, z, r = (np.asarray(v, dtype=np.float64) for v in (x, y, z, r))
+
+    j = (firstRandom(ids) - 1.0) / 3.0
+    t = np.arcsin(x / np.abs(x) * (z / np.sqrt(x**2 + z**2))) + j
+    s = 20.0 * (1.0 / 40.0 * (10 * np.log10(r / 10**6) - 39)) ** 20.0 + 1.0 / 2.0
+    s = np.clip(s, 0.5, 10.5)
+    d = r * (s + 1) + 1000000
+
+    return np.stack((x + d * np.sin(t), y + 1.0 / 2.0 * r * np.sin(j), z - d * np.cos(t)), axis=-1)
+
+
+class WarpInTable:
+    """
+    Precomputed warp-in points, indexed directly by celestial ID.
+
+    Celestial IDs are close to sequential, so a dense offset array over the ID span gives O(1) lookups
+    while staying small. The table is stored as a single `.npz` file.
+    """
+
+    def __init__(self, min_id, index, points):
+        self.min_id = int(min_id)
+        self.index = index
+        self.points = points
+
+    @classmethod
+    def build(cls, ids, x, y, z, r):
+        ids = np.asarray(ids, dtype=np.int64)
+        min_id = ids.min()
+        index = np.full(ids.max() - min_id + 1, -1, dtype=np.int32)
+        index[ids - min_id] = np.arange(ids.size, dtype=np.int32)
+        return cls(min_id, index, warpinBatch(ids, x, y, z, r))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["min_id"], data["index"], data["points"])
+
+    def save(self, path):
+        np.savez_compressed(path, min_id=self.min_id, index=self.index, points=self.points)
+
+    def get(self, id):
+        """
+        :param int id: Celestial ID
+        :returns tuple[float, float, float]: The warp-in point, or None if the celestial is unknown
+        """
+        offset = id - self.min_id
+        if offset < 0 or offset >= self.index.size or self.index[offset] < 0:
+            return None
+        return tuple(self.points[self.index[offset]].tolist())
+
+
+if __name__ == "__main__":
+    # Check the batch against the scalar function in `planet-warp-in.py`.
+    import importlib.util
+    import random
+    from os.path import dirname, join
+
+    spec = importlib.util.spec_from_file_location("planet_warp_in", join(dirname(__file__), "planet-warp-in.py"))
+    planet_warp_in = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(planet_warp_in)
+
+    rng = np.random.default_rng(0)
+    ids = rng.integers(40000000, 40500000, 1000)
+    x, y, z = rng.uniform(-1e12, 1e12, (3, ids.size))
+    r = rng.uniform(1e6, 1e8, ids.size)
+
+    assert (firstRandom(ids) == [random.Random(int(id)).random() for id in ids]).all()
+
+    points = warpinBatch(ids, x, y, z, r)
+    for point, args in zip(points, zip(ids.tolist(), x, y, z, r)):
+        assert np.allclose(point, planet_warp_in.warpin(*args), rtol=1e-12, atol=0)
+
+    table = WarpInTable.build(ids, x, y, z, r)
+    assert table.get(int(ids[0])) == tuple(points[np.flatnonzero(ids == ids[0])[-1]].tolist())
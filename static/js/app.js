@@ -4,7 +4,6 @@
 const EveIndustryTracker = {
     // Configuration
     config: {
-        syncInterval: 300000, // 5 minutes
         apiTimeout: 30000,    // 30 seconds
         toastDuration: 5000   // 5 seconds
     },
@@ -13,7 +12,6 @@ const EveIndustryTracker = {
     init: function() {
         this.setupEventListeners();
         this.initializeComponents();
-        this.startPeriodicSync();
     },
 
     // Set up global event listeners
@@ -96,7 +94,7 @@ const EveIndustryTracker = {
         })
         .then(data => {
             if (data.success) {
-                this.showToast('Jobs synced successfully!', 'success');
+                this.showToast(data.coalesced ? 'Jobs are already up to date' : 'Jobs synced successfully!', 'success');
                 // Refresh page after a short delay
                 setTimeout(() => location.reload(), 1000);
             } else {
@@ -116,28 +114,6 @@ const EveIndustryTracker = {
         });
     },
 
-    // Start periodic job synchronization
-    startPeriodicSync: function() {
-        if (window.location.pathname !== '/dashboard') return;
-        
-        setInterval(() => {
-            // Only sync if page is visible and user is active
-            if (!document.hidden && this.isUserActive()) {
-                this.syncJobs();
-            }
-        }, this.config.syncInterval);
-    },
-
-    // Check if user is active (has interacted recently)
-    isUserActive: function() {
-        return (Date.now() - this.lastActivity) < 60000; // 1 minute
-    },
-
-    // Track user activity
-    trackActivity: function() {
-        this.lastActivity = Date.now();
-    },
-
     // Form validation
     validateForm: function(e) {
         const form = e.target;
@@ -357,10 +333,7 @@ const EveIndustryTracker = {
             clearTimeout(timeout);
             timeout = setTimeout(later, wait);
         };
-    },
-
-    // Initialize activity tracking
-    lastActivity: Date.now()
+    }
 };
 
 // Initialize when DOM is loaded
@@ -368,11 +341,6 @@ document.addEventListener('DOMContentLoaded', function() {
     EveIndustryTracker.init();
 });
 
-// Track user activity
-document.addEventListener('mousemove', EveIndustryTracker.trackActivity.bind(EveIndustryTracker));
-document.addEventListener('keypress', EveIndustryTracker.trackActivity.bind(EveIndustryTracker));
-document.addEventListener('scroll', EveIndustryTracker.trackActivity.bind(EveIndustryTracker));
-
 // Global functions for backward compatibility
 window.syncJobs = function() {
     EveIndustryTracker.syncJobs();
@@ -0,0 +1,103 @@
+"""
+Event-driven job sync scheduling.
+
+Instead of polling ESI on a fixed interval, the scheduler keeps a heap of the
+next time each user's industry jobs finish, sleeps until the earliest one, and
+then syncs only that user. An optional periodic re-check lets the owner
+reschedule from its own records, for jobs that are still reported active after
+they should have finished, or that were synced by another process.
+"""
+
+import heapq
+import threading
+import traceback
+from datetime import datetime
+
+# Returned by `_next` when the periodic re-check is due
+_RECHECK = object()
+
+
+class SyncScheduler:
+    """Calls `sync(key)` once the earliest scheduled time for `key` has passed"""
+
+    def __init__(self, sync):
+        self._sync = sync
+        self._heap = []  # (due, key), may contain stale entries
+        self._due = {}  # key -> the time `key` is actually due
+        self._condition = threading.Condition()
+        self._thread = None
+        self._recheck = None
+        self._recheck_interval = None
+        self._recheck_at = None
+
+    def schedule(self, key, due):
+        """Schedule a sync for `key` at `due`, unless one is already due earlier"""
+        with self._condition:
+            if key in self._due and self._due[key] <= due:
+                return
+            self._due[key] = due
+            heapq.heappush(self._heap, (due, key))
+            self._condition.notify()
+
+    def pending(self):
+        """Return a copy of the scheduled keys and when they are due"""
+        with self._condition:
+            return dict(self._due)
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self, recheck=None, recheck_interval=None):
+        """
+        Start the scheduler thread.
+
+        :param recheck: Called from the scheduler thread every `recheck_interval`, to schedule keys again
+        :param timedelta recheck_interval: Time between re-checks
+        """
+        with self._condition:
+            if self._thread is not None:
+                return
+            if recheck is not None:
+                self._recheck = recheck
+                self._recheck_interval = recheck_interval
+                self._recheck_at = datetime.utcnow() + recheck_interval
+            self._thread = threading.Thread(target=self._run, name='sync-scheduler', daemon=True)
+            self._thread.start()
+
+    def _next(self):
+        # Block until an entry is due, and return its key
+        with self._condition:
+            while True:
+                now = datetime.utcnow()
+                recheck_wait = None
+                if self._recheck_at is not None:
+                    if now >= self._recheck_at:
+                        self._recheck_at = now + self._recheck_interval
+                        return _RECHECK
+                    recheck_wait = (self._recheck_at - now).total_seconds()
+                if not self._heap:
+                    self._condition.wait(recheck_wait)
+                    continue
+                due, key = self._heap[0]
+                if self._due.get(key) != due:
+                    heapq.heappop(self._heap)  # Superseded by an earlier schedule() or already run
+                    continue
+                wait = (due - now).total_seconds()
+                if wait > 0:
+                    self._condition.wait(wait if recheck_wait is None else min(wait, recheck_wait))
+                    continue
+                heapq.heappop(self._heap)
+                del self._due[key]
+                return key
+
+    def _run(self):
+        while True:
+            key = self._next()
+            try:
+                if key is _RECHECK:
+                    self._recheck()
+                else:
+                    self._sync(key)
+            except Exception:
+                traceback.print_exc()
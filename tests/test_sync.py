@@ -0,0 +1,210 @@
+"""
+Industry job sync against a fake ESI that, like the real one, leaves completed
+jobs out of the job lists unless `include_completed` is requested.
+
+Run with `python -m unittest discover -s tests`.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+# The app reads its configuration on import
+directory = tempfile.mkdtemp(prefix='eve-industry-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(directory, 'test.db')}"
+os.environ['SDE_STORE_PATH'] = os.path.join(directory, 'sde.bin')
+os.environ['MARKET_DATA_PATH'] = os.path.join(directory, 'market.npz')
+os.environ['SHARD_BY_CORPORATION'] = ''
+os.environ['SYNC_SCHEDULER'] = ''
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module  # noqa: E402
+
+CHARACTER_ID = 2112000001
+OTHER_CHARACTER_ID = 2112000002  # A corporation member who doesn't use the app
+CORPORATION_ID = 98000001
+COMPLETED_STATUSES = {'delivered', 'cancelled', 'reverted'}
+
+
+def tearDownModule():
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+class FakeResponse:
+    def __init__(self, status_code, data=None):
+        self.status_code = status_code
+        self._data = data
+        self.headers = {}
+
+    def json(self):
+        return self._data
+
+
+class FakeESI:
+    """Serves `jobs` as the corporation's industry jobs"""
+
+    def __init__(self):
+        self.jobs = {}
+
+    def set_job(self, job_id, status, end_date, runs=10, completed_date=None, installer_id=CHARACTER_ID):
+        self.jobs[job_id] = {
+            'job_id': job_id, 'installer_id': installer_id, 'facility_id': 60003760, 'station_id': 60003760,
+            'activity_id': 1, 'blueprint_id': 1020000000 + job_id, 'blueprint_type_id': 691,
+            'blueprint_location_id': 60003760, 'output_location_id': 60003760, 'runs': runs,
+            'product_type_id': 587, 'status': status, 'duration': 3600,
+            'start_date': (end_date - timedelta(hours=1)).isoformat() + 'Z', 'end_date': end_date.isoformat() + 'Z',
+        }
+        if completed_date:
+            self.jobs[job_id]['completed_date'] = completed_date.isoformat() + 'Z'
+
+    def get(self, url, headers=None, params=None, **kwargs):
+        if url.endswith('/industry/jobs/') and '/corporations/' in url:
+            include_completed = (params or {}).get('include_completed') == 'true'
+            return FakeResponse(200, [
+                job for job in self.jobs.values() if include_completed or job['status'] not in COMPLETED_STATUSES
+            ])
+        if url.endswith('/industry/jobs/'):
+            return FakeResponse(200, [])
+        return FakeResponse(404)
+
+
+class SyncTestCase(unittest.TestCase):
+    def setUp(self):
+        self.esi = FakeESI()
+        patcher = mock.patch.object(app_module.requests, 'get', self.esi.get)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.context = app_module.app.app_context()
+        self.context.push()
+        self.addCleanup(self.context.pop)
+        app_module.db.drop_all()
+        app_module.db.create_all()
+        app_module.job_snapshots.clear()
+        self.user = app_module.User(
+            character_id=CHARACTER_ID, character_name='Test Character', corporation_id=CORPORATION_ID,
+            access_token='token', refresh_token='token', token_expires=datetime.utcnow() + timedelta(days=1)
+        )
+        app_module.db.session.add(self.user)
+        app_module.db.session.commit()
+
+    def sync(self):
+        self.assertTrue(app_module.sync_industry_jobs(self.user))
+
+    def job(self, job_id):
+        return app_module.IndustryJob.query.filter_by(job_id=job_id).one()
+
+
+class JobChangeTest(SyncTestCase):
+    def test_delivered_transition_is_logged(self):
+        end_date = datetime.utcnow().replace(microsecond=0) - timedelta(minutes=5)
+        self.esi.set_job(1, 'ready', end_date)
+        self.sync()
+
+        self.esi.set_job(1, 'delivered', end_date, completed_date=end_date + timedelta(minutes=1))
+        self.sync()
+
+        self.assertEqual(self.job(1).status, 'delivered')
+        changes = app_module.JobChange.query.filter_by(job_id=1).order_by(app_module.JobChange.id).all()
+        self.assertEqual(
+            [(change.old_status, change.new_status) for change in changes],
+            [(None, 'ready'), ('ready', 'delivered')]
+        )
+
+
+class SyncFailureTest(SyncTestCase):
+    def test_failed_sync_is_rolled_back(self):
+        self.esi.set_job(1, 'active', datetime.utcnow() + timedelta(hours=1))
+        with mock.patch.object(app_module, 'add_job_rollups', side_effect=RuntimeError('broken')), \
+                mock.patch.object(app_module.app.logger, 'exception'):
+            self.assertFalse(app_module.sync_industry_jobs(self.user))
+
+        self.assertEqual(app_module.IndustryJob.query.count(), 0)
+        self.sync()
+        self.assertEqual(self.job(1).status, 'active')
+
+
+class JobSnapshotTest(SyncTestCase):
+    def test_snapshot_is_patched_by_syncs(self):
+        self.esi.set_job(1, 'active', datetime.utcnow() + timedelta(hours=1))
+        self.sync()
+        snapshot = app_module.get_job_snapshot(CORPORATION_ID)
+        self.esi.set_job(2, 'active', datetime.utcnow() + timedelta(hours=1))
+        self.sync()
+
+        self.assertIs(app_module.get_job_snapshot(CORPORATION_ID), snapshot)
+        self.assertEqual(snapshot.count_by('status'), {'active': 2})
+
+    def test_required_job_changes_keep_snapshot(self):
+        snapshot = app_module.get_job_snapshot(CORPORATION_ID)
+        app_module.bump_data_version(CORPORATION_ID, 'requirements')
+        app_module.db.session.commit()
+        self.assertIs(app_module.get_job_snapshot(CORPORATION_ID), snapshot)
+
+    def test_changes_by_other_processes_rebuild_snapshot(self):
+        snapshot = app_module.get_job_snapshot(CORPORATION_ID)
+        self.esi.set_job(1, 'active', datetime.utcnow() + timedelta(hours=1))
+        with mock.patch.object(app_module, 'update_job_snapshot'):  # As if another process synced
+            self.sync()
+
+        rebuilt = app_module.get_job_snapshot(CORPORATION_ID)
+        self.assertIsNot(rebuilt, snapshot)
+        self.assertEqual(rebuilt.count_by('status'), {'active': 1})
+
+
+class JobRollupTest(SyncTestCase):
+    def rollups(self, granularity):
+        return [
+            (rollup.period_start, rollup.installer_id, rollup.product_type_id, rollup.jobs, rollup.runs)
+            for rollup in app_module.JobRollup.query.filter_by(granularity=granularity).order_by(app_module.JobRollup.id)
+        ]
+
+    def test_delivered_jobs_are_counted_once(self):
+        completed = datetime(2024, 5, 1, 12, 30)
+        self.esi.set_job(1, 'active', completed, runs=10)
+        self.esi.set_job(2, 'active', completed, runs=5)
+        self.sync()
+        self.assertEqual(self.rollups('day'), [])
+
+        self.esi.set_job(1, 'delivered', completed, runs=10, completed_date=completed)
+        self.sync()
+        self.esi.set_job(2, 'delivered', completed, runs=5, completed_date=completed + timedelta(minutes=10))
+        self.sync()
+        self.sync()  # Jobs that stay delivered are not counted again
+
+        self.assertEqual(self.rollups('hour'), [(datetime(2024, 5, 1, 12), CHARACTER_ID, 587, 2, 15)])
+        self.assertEqual(self.rollups('day'), [(datetime(2024, 5, 1), CHARACTER_ID, 587, 2, 15)])
+
+    def test_corporation_jobs_are_counted_for_their_installer(self):
+        completed = datetime(2024, 5, 1, 12, 30)
+        self.esi.set_job(1, 'active', completed, runs=4, installer_id=OTHER_CHARACTER_ID)
+        self.sync()
+        self.esi.set_job(1, 'delivered', completed, runs=4, completed_date=completed, installer_id=OTHER_CHARACTER_ID)
+        self.sync()
+
+        self.assertEqual(self.job(1).installer_character_id, OTHER_CHARACTER_ID)
+        self.assertEqual(self.rollups('day'), [(datetime(2024, 5, 1), OTHER_CHARACTER_ID, 587, 1, 4)])
+
+    def test_backfill_matches_sync(self):
+        completed = datetime(2024, 5, 1, 12, 30)
+        for job_id in range(1, 4):
+            self.esi.set_job(job_id, 'active', completed + timedelta(hours=job_id))
+        self.sync()
+        for job_id in range(1, 4):
+            self.esi.set_job(job_id, 'delivered', completed + timedelta(hours=job_id),
+                             completed_date=completed + timedelta(hours=job_id))
+        self.sync()
+        synced = self.rollups('hour'), self.rollups('day')
+
+        result = app_module.app.test_cli_runner().invoke(args=['rollup-backfill'])
+        self.assertIsNone(result.exception)
+        self.assertEqual(sorted(synced[0]), sorted(self.rollups('hour')))
+        self.assertEqual(sorted(synced[1]), sorted(self.rollups('day')))
+
+
+if __name__ == '__main__':
+    unittest.main()